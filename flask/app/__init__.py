@@ -1,3 +1,4 @@
+import sys
 import traceback
 import redis
 from flask import Flask
@@ -6,17 +7,39 @@ from flask_cors import CORS
 from app.core.mongo_db import mongo
 from config import config_by_name
 from app.core.errors import DbConnectError
-from app.resources.particles import update_unique_particles_job
-from app.resources.users import delete_not_existing_users_likes
+from app.resources.users import delete_not_existing_users_likes_job
 from app.core.database import db
 from app.core.redis import redis_client
+from app.core.pubsub import start_listener_job
+from app.core.bootstrap import run_bootstrap, startup_report, gen_source_version
+from app.core import verb_particles
+from app.core.verb_particles import rebuild_verb_particles
+from app.core.like_counter import reconcile_like_counts_job, flush_like_toggles_job
+from app.core.crawler_queue import crawler_workers_job
 
 config = None
 
-def init_settings():
+def init_settings(app):
+    """Schema and index creation, done by one process per deployment"""
+    steps = [
+        ("create_tables", lambda: set_db(app)),
+        ("create_mongodb_indexes", set_mongodb_indexes),
+        ("rebuild_verb_particles", rebuild_verb_particles),
+    ]
+    from app.core.models import user, user_role
+
+    # the tables, indexes and rebuilds of the steps are defined in these
+    version = gen_source_version(
+        [sys.modules[__name__], user, user_role, verb_particles]
+    )
     try:
-        delete_not_existing_users_likes()
-        set_mongodb_indexes()
+        run_bootstrap(startup_report, steps, version)
+    except redis.exceptions.RedisError:  # can't elect, bootstrap alone
+        traceback.print_exc()
+        startup_report.role = "standalone"
+        for name, func in steps:
+            with startup_report.phase(name):
+                func()
     except DbConnectError as e:
         print(e)
     except:
@@ -25,7 +48,11 @@ def init_settings():
 
 # thread
 def background_task():
-    update_unique_particles_job()
+    start_listener_job()
+    reconcile_like_counts_job()
+    flush_like_toggles_job()
+    delete_not_existing_users_likes_job()
+    crawler_workers_job()
 
 def set_db(app):
     with app.app_context():
@@ -39,10 +66,14 @@ def set_db(app):
 def set_mongodb_indexes():
     print("set mongodb indexes")
     mongo.db.idioms.create_index([("$**", "text")])
+    mongo.db.idioms.create_index([("is_public", 1), ("_id", 1)])
     mongo.db.user_like_idiom.create_index([("userId", 1)])
+    mongo.db.user_like_idiom.create_index([("userId", 1), ("active", 1)])
     mongo.db.user_like_idiom.create_index([("idiomId", 1)])
     mongo.db.phrasal_verbs.create_index([("$**", "text")])
+    mongo.db.phrasal_verbs.create_index([("is_public", 1), ("_id", 1)])
     mongo.db.user_like_phrasal_verb.create_index([("userId", 1)])
+    mongo.db.user_like_phrasal_verb.create_index([("userId", 1), ("active", 1)])
     mongo.db.user_like_phrasal_verb.create_index([("phrasalVerbId", 1)])
 
 
@@ -52,16 +83,21 @@ def create_app(config_name):
     app.config.from_object(app_config)
     global config
     config = app_config
-    mongo.init_app(app)
 
-    CORS(app, resources={r"/v1/*": {"origins": "*"}})
-    db.init_app(app)
-    set_db(app)
-    redis_client.init_app(app)
-    from app.resources import blueprint as api
-    app.register_blueprint(api, url_prefix="/v1")
-    init_settings()
+    with startup_report.phase("init_extensions"):
+        # MongoClient and the redis client are thread and greenlet safe,
+        # their pools grow up to the requests a worker serves at once
+        mongo.init_app(app, maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"])
+        CORS(app, resources={r"/v1/*": {"origins": "*"}})
+        db.init_app(app)
+        redis_client.init_app(app)
+    with startup_report.phase("register_resources"):
+        from app.resources import blueprint as api
+        app.register_blueprint(api, url_prefix="/v1")
+    init_settings(app)
 
-    background_task()
+    with startup_report.phase("start_background_tasks"):
+        background_task()
+    startup_report.print()
 
     return app
@@ -0,0 +1,76 @@
+"""Read only asyncio app of the phrasal verb and idiom GET routes
+
+Serves the same payloads, etags and caches as the Flask resources from motor
+and aioredis, so one process holds many concurrent keep-alive clients. The
+writes and every other route stay on the Flask app.
+"""
+import asyncio
+import traceback
+
+import aioredis
+from aiohttp import web
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import config_by_name
+from app.core import pubsub
+from app.async_api.views import add_routes
+
+
+async def listen(redis):
+    """pubsub.listen of the event loop, the local caches stay invalidated"""
+    while True:
+        channel = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await channel.subscribe(*pubsub.handlers.keys())
+            for handler in pubsub.reconnect_handlers:
+                handler()
+            async for item in channel.listen():
+                if item["type"] != "message":
+                    continue
+                name, data = item["channel"], item["data"]
+                if isinstance(name, bytes):
+                    name = name.decode("utf-8")
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                pubsub.dispatch(name, data)
+        except asyncio.CancelledError:
+            raise
+        except:
+            traceback.print_exc()
+            await asyncio.sleep(pubsub.RECONNECT_WAIT_TIME)
+        finally:
+            await channel.close()
+
+
+async def init_clients(app):
+    config = app["config"]
+    app["mongo"] = AsyncIOMotorClient(
+        config.MONGO_URI, maxPoolSize=config.ASYNC_MONGO_MAX_POOL_SIZE
+    )
+    app["db"] = app["mongo"].get_default_database()
+    # waits for a free connection instead of failing when all are in use
+    pool = aioredis.BlockingConnectionPool.from_url(
+        config.REDIS_URL, max_connections=config.ASYNC_REDIS_MAX_CONNECTIONS
+    )
+    app["redis"] = aioredis.Redis(connection_pool=pool)
+    app["listener"] = asyncio.ensure_future(listen(app["redis"]))
+
+
+async def close_clients(app):
+    app["listener"].cancel()
+    try:
+        await app["listener"]
+    except asyncio.CancelledError:
+        pass
+    await app["redis"].close()
+    await app["redis"].connection_pool.disconnect()
+    app["mongo"].close()
+
+
+def create_async_app(config_name):
+    app = web.Application()
+    app["config"] = config_by_name[config_name]
+    app.on_startup.append(init_clients)
+    app.on_cleanup.append(close_clients)
+    add_routes(app)
+    return app
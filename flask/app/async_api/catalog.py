@@ -0,0 +1,275 @@
+import random
+import traceback
+
+from bson import ObjectId
+
+from app.core.auth import decode
+from app.core.catalog_terms import PHRASAL_VERB, IDIOM
+from app.core.fuzzy import fuzzy_index
+from app.core.serializer import encode, wrap_response_body
+from app.core.mongo_db import (
+    gen_in_query,
+    gen_restrict_access_query,
+    gen_return_fields_query,
+    find_page,
+    find_stream_bound,
+    find_stream_page,
+    find_offset_page,
+    find_text_search_page,
+    drop_text_scores,
+    is_text_searchable,
+    TEXT_SEARCH,
+    REGEX_SEARCH,
+)
+from app.core.random_pool import (
+    gen_random_pool_key,
+    gen_random_pool_ready_key,
+    gen_random_eligible_query,
+    gen_random_count,
+)
+from app.resources.phrasal_verbs import (
+    PHRASAL_VERB_LIST_KEY,
+    PHRASAL_VERB_CATALOG_KEY,
+    PHRASAL_VERB_LIST_VERSION_KEY,
+    catalog_cache,
+    gen_phrasal_verb_list_query,
+    gen_phrasal_verb_find_query,
+    gen_phrasal_verb_search_query,
+    gen_full_search_query as gen_phrasal_verb_full_search_query,
+)
+from app.resources.idioms import (
+    gen_idiom_list_query,
+    gen_idiom_find_query,
+    gen_full_search_query as gen_idiom_full_search_query,
+)
+
+
+async def publish_invalidation(redis, cache, key, version):
+    cache.invalidate(key, version)
+    try:
+        await redis.publish(cache.channel, f"{key}:{version}")
+    except:
+        traceback.print_exc()
+
+
+async def rebuild_random_pool(redis, collection):
+    """Collect the ids of the public docs having definitions and sentences"""
+    key = gen_random_pool_key(collection)
+    temp_key = f"{key}:rebuild"
+    ids = [
+        str(doc["_id"])
+        async for doc in collection.find(gen_random_eligible_query(), {"_id": 1})
+    ]
+    pipeline = redis.pipeline()
+    pipeline.delete(temp_key)
+    for i in range(0, len(ids), 1000):
+        pipeline.sadd(temp_key, *ids[i : i + 1000])
+    if ids:
+        pipeline.rename(temp_key, key)
+    else:
+        pipeline.delete(key)
+    pipeline.set(gen_random_pool_ready_key(collection), 1)
+    await pipeline.execute()
+
+
+async def get_random_docs(redis, collection, count):
+    """Sample ids from the pool and fetch the docs by _id"""
+    count = gen_random_count(count)
+    try:
+        if not await redis.exists(gen_random_pool_ready_key(collection)):
+            await rebuild_random_pool(redis, collection)
+        ids = await redis.srandmember(gen_random_pool_key(collection), count) or []
+        ids = [ObjectId(decode(id_)) for id_ in ids]
+        query = gen_in_query(field="_id", values=ids)
+        docs = await collection.find(query).to_list(length=None)
+        random.shuffle(docs)
+        return docs
+    except:
+        traceback.print_exc()
+        return None
+
+
+async def load_public_terms(db):
+    """(kind, term) of every public phrasal verb and idiom"""
+    query = gen_restrict_access_query()
+    terms = [
+        (PHRASAL_VERB, term)
+        for term in await db.phrasal_verbs.distinct("phrasal_verb", query)
+    ]
+    terms += [(IDIOM, term) for term in await db.idioms.distinct("expression", query)]
+    return terms
+
+
+async def search_similar_terms(db, kind, term):
+    """fuzzy_index.search, its terms are loaded through motor"""
+    if not fuzzy_index.loaded:
+        terms = await load_public_terms(db)
+        fuzzy_index.load_terms(terms)
+    # no await in between, a reset can't unload the index before the search
+    return fuzzy_index.search(kind, term)
+
+
+async def get_verbs_from_phrasal_verbs(db, limit=None, after=None, **kwargs):
+    try:
+        query, return_fields = gen_phrasal_verb_find_query(**kwargs)
+        docs = find_page(db.phrasal_verbs, query, return_fields, limit, after)
+        return await docs.to_list(length=None)
+    except:
+        traceback.print_exc()
+        return None
+
+
+async def stream_verbs_from_phrasal_verbs(db, limit=None, after=None, **kwargs):
+    """Return (docs, next page cursor or None) of a stream of at most limit docs"""
+    query, return_fields = gen_phrasal_verb_find_query(**kwargs)
+    bound = None
+    if limit is not None:
+        bound = find_stream_bound(db.phrasal_verbs, query, limit, after)
+        bound = await bound.to_list(length=2)
+    return find_stream_page(db.phrasal_verbs, query, return_fields, limit, after, bound)
+
+
+async def update_cached_phrasal_verb_list(db, redis):
+    """Rebuild the whole cached catalog from mongodb"""
+    phrasal_verb_list = await get_verbs_from_phrasal_verbs(db)
+    if phrasal_verb_list is None:
+        return
+    temp_key = f"{PHRASAL_VERB_CATALOG_KEY}:rebuild"
+    pipeline = redis.pipeline()
+    pipeline.delete(temp_key)
+    for item in phrasal_verb_list:
+        pipeline.hset(temp_key, item["phrasal_verb"], encode(item))
+    if phrasal_verb_list:
+        pipeline.rename(temp_key, PHRASAL_VERB_CATALOG_KEY)
+    else:
+        pipeline.delete(PHRASAL_VERB_CATALOG_KEY)
+    pipeline.incr(PHRASAL_VERB_LIST_VERSION_KEY)
+    version = (await pipeline.execute())[-1]
+    await publish_invalidation(redis, catalog_cache, PHRASAL_VERB_LIST_KEY, version)
+
+
+async def get_cached_phrasal_verb_entries(redis):
+    pipeline = redis.pipeline()
+    pipeline.get(PHRASAL_VERB_LIST_VERSION_KEY)
+    pipeline.hgetall(PHRASAL_VERB_CATALOG_KEY)
+    return await pipeline.execute()
+
+
+async def get_cached_phrasal_verb_list_body(db, redis):
+    """Encoded response body of the public phrasal verb list, as the Flask app"""
+    if body := catalog_cache.get(PHRASAL_VERB_LIST_KEY):
+        return body
+
+    version, entries = await get_cached_phrasal_verb_entries(redis)
+    if version is None:
+        await update_cached_phrasal_verb_list(db, redis)
+        version, entries = await get_cached_phrasal_verb_entries(redis)
+        if version is None:
+            return wrap_response_body(b"null", "SUCCESS")
+
+    items = b", ".join(entries[key] for key in sorted(entries))
+    phrasal_verb_list = b"[" + items + b"]"
+    body = wrap_response_body(phrasal_verb_list, "SUCCESS")
+    catalog_cache.set(PHRASAL_VERB_LIST_KEY, int(version), body)
+    return body
+
+
+async def search_phrasal_verbs(
+    db, search_key, only_public=True, limit=None, cursor=None
+):
+    """Ranked search, returns (docs, strategy served the query)"""
+    try:
+        strategy, offset = cursor or (None, 0)
+        query, return_fields = gen_phrasal_verb_list_query(only_public)
+        if strategy != REGEX_SEARCH and is_text_searchable(search_key):
+            docs = drop_text_scores(
+                await find_text_search_page(
+                    db.phrasal_verbs, query, search_key, return_fields, limit, offset
+                ).to_list(length=None)
+            )
+            if docs or strategy == TEXT_SEARCH:
+                return docs, TEXT_SEARCH
+        query.update(gen_phrasal_verb_full_search_query(search_key, exact=0))
+        docs = find_offset_page(db.phrasal_verbs, query, return_fields, limit, offset)
+        return await docs.to_list(length=None), REGEX_SEARCH
+    except:
+        traceback.print_exc()
+        return None, None
+
+
+async def get_phrasal_verb(db, phrasal_verb):
+    try:
+        query = gen_restrict_access_query()
+        query.update(gen_phrasal_verb_search_query(phrasal_verb))
+        return_fields = gen_return_fields_query(excludes=["dictionaries", "is_public"])
+        return await db.phrasal_verbs.find(query, return_fields).to_list(length=None)
+    except:
+        traceback.print_exc()
+        return None
+
+
+async def get_phrasal_verb_with_dictionary(db, phrasal_verb):
+    try:
+        search_query = gen_phrasal_verb_search_query(phrasal_verb)
+        return await db.phrasal_verbs.find(search_query).to_list(length=None)
+    except:
+        traceback.print_exc()
+        return None
+
+
+def find_idioms(db, limit=None, after=None, **kwargs):
+    return find_page(db.idioms, gen_idiom_find_query(**kwargs), None, limit, after)
+
+
+async def stream_idioms(db, limit=None, after=None, **kwargs):
+    """Return (docs, next page cursor or None) of a stream of at most limit docs"""
+    query = gen_idiom_find_query(**kwargs)
+    bound = None
+    if limit is not None:
+        bound = find_stream_bound(db.idioms, query, limit, after)
+        bound = await bound.to_list(length=2)
+    return find_stream_page(db.idioms, query, None, limit, after, bound)
+
+
+async def get_idioms(db, **kwargs):
+    try:
+        return await find_idioms(db, **kwargs).to_list(length=None)
+    except:
+        traceback.print_exc()
+        return None
+
+
+async def search_idioms(db, search_key, only_public=False, limit=None, cursor=None):
+    """Ranked search, returns (docs, strategy served the query)"""
+    try:
+        strategy, offset = cursor or (None, 0)
+        query = gen_idiom_list_query(only_public)
+        if strategy != REGEX_SEARCH and is_text_searchable(search_key):
+            docs = drop_text_scores(
+                await find_text_search_page(
+                    db.idioms, query, search_key, None, limit, offset
+                ).to_list(length=None)
+            )
+            if docs or strategy == TEXT_SEARCH:
+                return docs, TEXT_SEARCH
+        query.update(gen_idiom_full_search_query(search_key, exact=0))
+        docs = find_offset_page(db.idioms, query, None, limit, offset)
+        return await docs.to_list(length=None), REGEX_SEARCH
+    except:
+        traceback.print_exc()
+        return None, None
+
+
+async def get_idiom_with_dictionary(db, idiom):
+    return await db.idioms.find({"expression": idiom}).to_list(length=None)
+
+
+async def get_idiom(db, idiom):
+    try:
+        query = gen_restrict_access_query()
+        query.update({"expression": idiom})
+        return_fields = gen_return_fields_query(excludes=["dictionaries", "is_public"])
+        return await db.idioms.find(query, return_fields).to_list(length=None)
+    except:
+        traceback.print_exc()
+        return None
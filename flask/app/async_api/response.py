@@ -0,0 +1,226 @@
+import asyncio
+import traceback
+
+from aiohttp import web
+from aioredis.exceptions import ResponseError
+
+from app.core.constants import response
+from app.core.auth import AuthUser, auth_cache, gen_session_key, decode
+from app.core.content_version import (
+    gen_content_version_key,
+    gen_initial_version,
+    gen_etag,
+)
+from app.core.response import CustomeResponse
+from app.core.serializer import encode, encode_response_body
+from app.core.variables import TOKEN_VALID_TIME, SESSION_SLIDING_EXPIRY
+
+
+STREAM_MIMETYPE = "application/x-ndjson"
+
+
+def send(
+    result=None, response_type=None, lang="en", additional_message=None, headers=None
+):
+    return send_encoded(
+        encode_response_body(result, response_type, lang, additional_message),
+        response_type,
+        headers,
+    )
+
+
+def send_encoded(body, response_type=None, headers=None):
+    """Send a body already built by wrap_response_body"""
+    return web.Response(
+        body=body,
+        status=response.status[response_type],
+        headers={**CustomeResponse.headers, **(headers or {})},
+        content_type="application/json",
+    )
+
+
+def send_not_modified(etag):
+    return web.Response(
+        status=response.status["NOT_MODIFIED"],
+        headers={**CustomeResponse.headers, "ETag": f'"{etag}"'},
+    )
+
+
+async def send_stream(request, cursor, response_type="SUCCESS", headers=None):
+    """Encode and write docs one by one as NDJSON, as CustomeResponse.send_stream"""
+    headers = {**CustomeResponse.headers, **(headers or {})}
+    if etag := request.get("etag"):  # headers can't change once streaming
+        headers["ETag"] = f'"{etag}"'
+    stream = web.StreamResponse(status=response.status[response_type], headers=headers)
+    stream.content_type = STREAM_MIMETYPE
+    await stream.prepare(request)
+    try:
+        async for doc in cursor:
+            await stream.write(encode(doc) + b"\n")
+    except asyncio.CancelledError:  # the client went away
+        raise
+    except:
+        traceback.print_exc()
+        await stream.write(encode_response_body(None, "SEVER_ERROR") + b"\n")
+    await stream.write_eof()
+    return stream
+
+
+def parse_accept(header):
+    """[(mimetype, quality)] of an Accept header"""
+    items = []
+    for item in header.split(","):
+        mimetype, *params = [part.strip() for part in item.split(";")]
+        if not mimetype:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        items.append((mimetype.lower(), quality))
+    return items
+
+
+def best_match(header, matches):
+    """Same choice as werkzeug's MIMEAccept.best_match, earlier match on ties"""
+    client_items = parse_accept(header)
+    result = None
+    best = (0, -1)
+    for match in matches:
+        match_type, match_subtype = match.split("/")
+        for mimetype, quality in client_items:
+            client_type, _, client_subtype = mimetype.partition("/")
+            if client_type not in ("*", match_type):
+                continue
+            if client_subtype not in ("*", match_subtype):
+                continue
+            specificity = (client_type != "*") + (client_subtype != "*")
+            if quality > 0 and (quality, specificity) > best:
+                result = match
+                best = (quality, specificity)
+    return result
+
+
+def is_stream_requested(request):
+    """Clients opt in to NDJSON streaming with 'Accept: application/x-ndjson'"""
+    header = request.headers.get("Accept")
+    if not header:
+        return False
+    return best_match(header, ["application/json", STREAM_MIMETYPE]) == STREAM_MIMETYPE
+
+
+async def get_auth_user(redis, request):
+    """AuthUser of the request's session record or None, as auth.get_auth_user
+
+    Bare token sessions predating the records need MySQL and stay with the
+    Flask app, they are read as anonymous here.
+    """
+    token = request.headers.get("Authorization")
+    if not token:
+        return None
+    if auth_user := auth_cache.get(token):
+        return auth_user
+    pipeline = redis.pipeline()
+    pipeline.hgetall(gen_session_key(token))
+    if SESSION_SLIDING_EXPIRY:
+        pipeline.expire(gen_session_key(token), TOKEN_VALID_TIME)
+    try:
+        record = (await pipeline.execute())[0]
+        if not record:
+            return None
+        record = {decode(key): decode(value) for key, value in record.items()}
+        auth_user = AuthUser.from_session_record(record)
+    except (KeyError, ValueError, ResponseError):  # not a session record
+        traceback.print_exc()
+        return None
+    auth_cache.set(token, auth_user)
+    return auth_user
+
+
+async def get_content_version(redis, collection):
+    key = gen_content_version_key(collection)
+    if version := await redis.get(key):
+        return int(version)
+    await redis.set(key, gen_initial_version(), nx=True)
+    return int(await redis.get(key))
+
+
+def gen_full_path(request):
+    # werkzeug's request.full_path, the etags are shared with the Flask app
+    return f"{request.path}?{request.rel_url.raw_query_string}"
+
+
+def if_none_match_contains(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or f'"{etag}"' in tags
+
+
+def token_checker(f):
+    async def wrapper(request):
+        auth_user = await get_auth_user(request.app["redis"], request)
+        return await f(request, auth_user=auth_user)
+
+    wrapper.__doc__ = f.__doc__
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+
+def return_304_for_not_modified(collection):
+    """Must be placed under token_checker as admins get different payloads
+
+    The response goes without an etag when the version can't be read.
+    """
+
+    def decorator(f):
+        async def wrapper(request, **kwargs):
+            try:
+                version = await get_content_version(request.app["redis"], collection)
+            except asyncio.CancelledError:
+                raise
+            except:
+                traceback.print_exc()
+                return await f(request, **kwargs)
+            auth_user = kwargs.get("auth_user")
+            is_admin = 1 if auth_user and auth_user.is_admin() else 0
+            is_stream = 1 if is_stream_requested(request) else 0
+            etag = gen_etag(
+                collection,
+                version,
+                f"{gen_full_path(request)}|{is_admin}|{is_stream}",
+            )
+            if if_none_match_contains(request, etag):
+                return send_not_modified(etag)
+
+            request["etag"] = etag
+            result = await f(request, **kwargs)
+            if result.status == 200 and not result.prepared:
+                result.headers["ETag"] = f'"{etag}"'
+            return result
+
+        wrapper.__doc__ = f.__doc__
+        wrapper.__name__ = f.__name__
+        return wrapper
+
+    return decorator
+
+
+def return_500_for_sever_error(f):
+    async def wrapper(request, **kwargs):
+        try:
+            return await f(request, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except:
+            traceback.print_exc()
+            return send(response_type="SEVER_ERROR")
+
+    wrapper.__doc__ = f.__doc__
+    wrapper.__name__ = f.__name__
+    return wrapper
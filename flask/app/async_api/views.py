@@ -0,0 +1,220 @@
+from app.core.catalog_terms import PHRASAL_VERB, IDIOM
+from app.core.mongo_db import (
+    gen_page_limit,
+    split_page,
+    split_search_page,
+    gen_page_headers,
+    decode_page_cursor,
+    decode_search_cursor,
+)
+from app.async_api import catalog
+from app.async_api.response import (
+    send,
+    send_encoded,
+    send_stream,
+    is_stream_requested,
+    token_checker,
+    return_304_for_not_modified,
+    return_500_for_sever_error,
+)
+
+
+def parse_args(request, int_fields=(), str_fields=()):
+    """Query args as the resources' parsers read them, missing ones are None
+
+    Like reqparse behind return_500_for_sever_error, a value int() can't
+    parse ends in a server error response.
+    """
+    args = {}
+    for field in int_fields:
+        value = request.query.get(field)
+        args[field] = None if value is None else int(value)
+    for field in str_fields:
+        args[field] = request.query.get(field)
+    return args
+
+
+def parse_search_args(request):
+    return parse_args(
+        request,
+        int_fields=("full_search", "exact", "text_search", "limit"),
+        str_fields=("search_key", "after"),
+    )
+
+
+def is_only_public(auth_user):
+    return False if auth_user and auth_user.is_admin() else True
+
+
+def send_search_page(result, strategy, limit, cursor):
+    offset = cursor[1] if cursor else 0
+    result, next_cursor = split_search_page(result, limit, offset, strategy)
+    return send(
+        response_type="SUCCESS",
+        result=result,
+        headers=gen_page_headers(next_cursor, search_strategy=strategy),
+    )
+
+
+@token_checker
+@return_304_for_not_modified("phrasal_verbs")
+@return_500_for_sever_error
+async def get_phrasal_verbs(request, **kwargs):
+    """List all phrasal verbs"""
+    db, redis = request.app["db"], request.app["redis"]
+    only_public = is_only_public(kwargs["auth_user"])
+    args = parse_search_args(request)
+    search_key = args["search_key"]
+
+    is_paginated = args["limit"] or args["after"]
+    is_stream = is_stream_requested(request)
+    if only_public and not any(
+        [search_key, args["full_search"], args["exact"], is_paginated, is_stream]
+    ):
+        body = await catalog.get_cached_phrasal_verb_list_body(db, redis)
+        return send_encoded(body, response_type="SUCCESS")
+    if args["text_search"] and search_key:
+        cursor = None
+        if args["after"] and (cursor := decode_search_cursor(args["after"])) is None:
+            return send(response_type="FAIL", additional_message="Invalid cursor")
+        limit = gen_page_limit(args["limit"])
+        result, strategy = await catalog.search_phrasal_verbs(
+            db, search_key, only_public, limit, cursor
+        )
+        return send_search_page(result, strategy, limit, cursor)
+    if args["after"] and decode_page_cursor(args["after"]) is None:
+        return send(response_type="FAIL", additional_message="Invalid cursor")
+    search_args = {
+        "search_key": search_key,
+        "full_search": args["full_search"],
+        "exact": args["exact"],
+        "only_public": only_public,
+        "after": args["after"],
+    }
+    if is_stream:
+        if args["limit"] is not None and args["limit"] < 1:
+            return send(
+                response_type="FAIL", additional_message="limit must be positive"
+            )
+        docs, next_cursor = await catalog.stream_verbs_from_phrasal_verbs(
+            db, limit=args["limit"], **search_args
+        )
+        return await send_stream(request, docs, headers=gen_page_headers(next_cursor))
+
+    limit = gen_page_limit(args["limit"])
+    result = await catalog.get_verbs_from_phrasal_verbs(db, limit=limit, **search_args)
+    result, next_cursor = split_page(result, limit)
+    return send(
+        response_type="SUCCESS", result=result, headers=gen_page_headers(next_cursor)
+    )
+
+
+@return_500_for_sever_error
+async def get_random_phrasal_verbs(request):
+    """List random phrasal verbs"""
+    args = parse_args(request, int_fields=("count",))
+    result = await catalog.get_random_docs(
+        request.app["redis"], request.app["db"].phrasal_verbs, args["count"]
+    )
+    return send(response_type="SUCCESS", result=result)
+
+
+@token_checker
+@return_304_for_not_modified("phrasal_verbs")
+@return_500_for_sever_error
+async def get_phrasal_verb(request, **kwargs):
+    """Get a phrasal verb"""
+    db = request.app["db"]
+    phrasal_verb = request.match_info["phrasal_verb"]
+    if kwargs["auth_user"] and kwargs["auth_user"].is_admin():
+        result = await catalog.get_phrasal_verb_with_dictionary(db, phrasal_verb)
+    else:
+        result = await catalog.get_phrasal_verb(db, phrasal_verb)
+
+    if result:
+        return send(response_type="SUCCESS", result=result)
+    else:
+        term = phrasal_verb.replace("-", " ")
+        did_you_mean = await catalog.search_similar_terms(db, PHRASAL_VERB, term)
+        return send(response_type="NOT_FOUND", result={"did_you_mean": did_you_mean})
+
+
+@token_checker
+@return_304_for_not_modified("idioms")
+@return_500_for_sever_error
+async def get_idioms(request, **kwargs):
+    db = request.app["db"]
+    only_public = is_only_public(kwargs["auth_user"])
+    args = parse_search_args(request)
+    if args["text_search"] and args["search_key"]:
+        cursor = None
+        if args["after"] and (cursor := decode_search_cursor(args["after"])) is None:
+            return send(response_type="FAIL", additional_message="Invalid cursor")
+        limit = gen_page_limit(args["limit"])
+        result, strategy = await catalog.search_idioms(
+            db, args["search_key"], only_public, limit, cursor
+        )
+        return send_search_page(result, strategy, limit, cursor)
+    if args["after"] and decode_page_cursor(args["after"]) is None:
+        return send(response_type="FAIL", additional_message="Invalid cursor")
+    search_args = {
+        "search_key": args["search_key"],
+        "full_search": args["full_search"],
+        "exact": args["exact"],
+        "only_public": only_public,
+        "after": args["after"],
+    }
+    if is_stream_requested(request):
+        if args["limit"] is not None and args["limit"] < 1:
+            return send(
+                response_type="FAIL", additional_message="limit must be positive"
+            )
+        docs, next_cursor = await catalog.stream_idioms(
+            db, limit=args["limit"], **search_args
+        )
+        return await send_stream(request, docs, headers=gen_page_headers(next_cursor))
+
+    limit = gen_page_limit(args["limit"])
+    result = await catalog.get_idioms(db, limit=limit, **search_args)
+    result, next_cursor = split_page(result, limit)
+    return send(
+        response_type="SUCCESS", result=result, headers=gen_page_headers(next_cursor)
+    )
+
+
+@return_500_for_sever_error
+async def get_random_idioms(request):
+    """List random idioms"""
+    args = parse_args(request, int_fields=("count",))
+    result = await catalog.get_random_docs(
+        request.app["redis"], request.app["db"].idioms, args["count"]
+    )
+    return send(response_type="SUCCESS", result=result)
+
+
+@token_checker
+@return_304_for_not_modified("idioms")
+@return_500_for_sever_error
+async def get_idiom(request, **kwargs):
+    """Get a idiom verb"""
+    db = request.app["db"]
+    idiom = request.match_info["idiom"]
+    if kwargs["auth_user"] and kwargs["auth_user"].is_admin():
+        result = await catalog.get_idiom_with_dictionary(db, idiom)
+    else:
+        result = await catalog.get_idiom(db, idiom)
+    if result:
+        return send(response_type="SUCCESS", result=result)
+    else:
+        did_you_mean = await catalog.search_similar_terms(db, IDIOM, idiom)
+        return send(response_type="NOT_FOUND", result={"did_you_mean": did_you_mean})
+
+
+def add_routes(app):
+    # the static routes first, /random isn't a phrasal verb or an idiom
+    app.router.add_get("/v1/phrasal-verbs/", get_phrasal_verbs)
+    app.router.add_get("/v1/phrasal-verbs/random", get_random_phrasal_verbs)
+    app.router.add_get("/v1/phrasal-verbs/{phrasal_verb}", get_phrasal_verb)
+    app.router.add_get("/v1/idioms/", get_idioms)
+    app.router.add_get("/v1/idioms/random", get_random_idioms)
+    app.router.add_get("/v1/idioms/{idiom}", get_idiom)
@@ -0,0 +1,312 @@
+import os
+import re
+import time
+import traceback
+from collections import OrderedDict
+from threading import Lock
+
+from redis.exceptions import ResponseError
+
+from app.core import pubsub
+from app.core.redis import redis_client
+from app.core.utils import random_string_digits
+from app.core.variables import (
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TIME,
+    TOKEN_VALID_TIME,
+    SESSION_SLIDING_EXPIRY,
+)
+
+
+AUTH_CACHE_CHANNEL = "auth_cache"
+
+
+class AuthUser:
+    """Identity and role of a session's user, detached from the db session"""
+
+    __slots__ = ("id", "username", "role_id")
+
+    def __init__(self, id_, username, role_id):
+        self.id = id_
+        self.username = username
+        self.role_id = role_id
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.role_id)
+
+    @classmethod
+    def from_session_record(cls, record):
+        role_id = int(record["role_id"]) if record["role_id"] else None
+        return cls(int(record["id"]), record["username"], role_id)
+
+    def is_admin(self):
+        return self.role_id == int(os.getenv("ADMIN_ROLE_ID"))
+
+    def is_manager(self):
+        return self.role_id == int(os.getenv("MANAGER_ROLE_ID"))
+
+
+class AuthCache:
+    """Per worker LRU cache of session token -> AuthUser
+
+    Entries live for AUTH_CACHE_TIME at most, user updates and session deletes
+    drop them on every worker through pub/sub.
+    """
+
+    def __init__(self, channel, maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TIME):
+        self.channel = channel
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        pubsub.subscribe(channel, self.handle_message)
+        pubsub.on_reconnect(self.clear)
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, auth_user):
+        with self.lock:
+            self.entries[token] = (time.monotonic() + self.ttl, auth_user)
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate_token(self, token):
+        with self.lock:
+            self.entries.pop(token, None)
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            tokens = [
+                token
+                for token, (_, auth_user) in self.entries.items()
+                if auth_user.id == user_id
+            ]
+            for token in tokens:
+                del self.entries[token]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def handle_message(self, message):
+        kind, value = message.split(":", 1)
+        if kind == "token":
+            self.invalidate_token(value)
+        elif kind == "user":
+            self.invalidate_user(int(value))
+
+    def get_stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "pid": os.getpid(),
+                "size": len(self.entries),
+                "max_size": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else None,
+            }
+
+
+auth_cache = AuthCache(AUTH_CACHE_CHANNEL)
+
+
+SESSION_USERS_KEY = "session_users"
+# logins before the session records stored token -> user id under the token
+LEGACY_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]{30}")
+
+
+def gen_session_key(token):
+    return f"session:{token}"
+
+
+def gen_user_sessions_key(user_id):
+    return f"user_sessions:{user_id}"
+
+
+def decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def prune_user_sessions(user_id):
+    """Drop the tokens whose records expired from the user's index"""
+    tokens = [
+        decode(token)
+        for token in redis_client.smembers(gen_user_sessions_key(user_id))
+    ]
+    pipeline = redis_client.pipeline()
+    for token in tokens:
+        pipeline.exists(gen_session_key(token))
+    expired = [token for token, exists in zip(tokens, pipeline.execute()) if not exists]
+    if expired:
+        redis_client.srem(gen_user_sessions_key(user_id), *expired)
+    return [token for token in tokens if token not in expired]
+
+
+def create_session(user):
+    """Store the user's identity and role under a new token
+
+    Requests are authorized from this record alone, MySQL isn't read again.
+    """
+    token = random_string_digits(30)
+    record = {
+        "id": user.id,
+        "username": user.username,
+        "role_id": "" if user.role_id is None else user.role_id,
+        "issued_at": int(time.time()),
+    }
+    prune_user_sessions(user.id)
+    pipeline = redis_client.pipeline()
+    pipeline.hset(gen_session_key(token), mapping=record)
+    pipeline.expire(gen_session_key(token), TOKEN_VALID_TIME)
+    pipeline.sadd(gen_user_sessions_key(user.id), token)
+    pipeline.sadd(SESSION_USERS_KEY, user.id)
+    pipeline.execute()
+    return token
+
+
+def get_session_record(token):
+    """Session record of the token, its expiry slides when enabled"""
+    pipeline = redis_client.pipeline()
+    pipeline.hgetall(gen_session_key(token))
+    if SESSION_SLIDING_EXPIRY:
+        pipeline.expire(gen_session_key(token), TOKEN_VALID_TIME)
+    record = pipeline.execute()[0]
+    return {decode(key): decode(value) for key, value in record.items()}
+
+
+def delete_session(token):
+    user_id = redis_client.hget(gen_session_key(token), "id")
+    pipeline = redis_client.pipeline()
+    pipeline.delete(gen_session_key(token))
+    if get_legacy_user_id(token) is not None:
+        pipeline.delete(token)
+    if user_id is not None:
+        pipeline.srem(gen_user_sessions_key(decode(user_id)), token)
+    pipeline.execute()
+    invalidate_session(token)
+
+
+def revoke_user_sessions(user_id):
+    """Delete every session of the user, found through the user's index"""
+    tokens = redis_client.smembers(gen_user_sessions_key(user_id))
+    pipeline = redis_client.pipeline()
+    for token in tokens:
+        pipeline.delete(gen_session_key(decode(token)))
+    pipeline.delete(gen_user_sessions_key(user_id))
+    pipeline.srem(SESSION_USERS_KEY, user_id)
+    pipeline.execute()
+    invalidate_user_sessions(user_id)
+    return len(tokens)
+
+
+def mask_token(token):
+    return token[:4] + "*" * (len(token) - 4)
+
+
+def get_sessions(user_id=None):
+    """Live sessions of a user or of every user, with masked tokens"""
+    if user_id is None:
+        user_ids = [decode(id_) for id_ in redis_client.smembers(SESSION_USERS_KEY)]
+    else:
+        user_ids = [user_id]
+    sessions = []
+    for user_id in user_ids:
+        tokens = prune_user_sessions(user_id)
+        if not tokens:
+            redis_client.srem(SESSION_USERS_KEY, user_id)
+            continue
+        pipeline = redis_client.pipeline()
+        for token in tokens:
+            pipeline.hgetall(gen_session_key(token))
+            pipeline.ttl(gen_session_key(token))
+        results = pipeline.execute()
+        for token, record, ttl in zip(tokens, results[::2], results[1::2]):
+            if not record:
+                continue
+            record = {decode(key): decode(value) for key, value in record.items()}
+            sessions.append(
+                {
+                    "user_id": int(record["id"]),
+                    "username": record["username"],
+                    "token": mask_token(token),
+                    "issued_at": int(record["issued_at"]),
+                    "ttl": ttl,
+                }
+            )
+    return sessions
+
+
+def get_legacy_user_id(token):
+    """User id of a bare token -> user id key written before the session records
+
+    Read only, the keys keep their TTL and are all gone TOKEN_VALID_TIME after
+    the records were deployed, this goes with them. Only a login token with a
+    user id value and an expiry passes, no other key of the app looks like one.
+    """
+    if not LEGACY_TOKEN_PATTERN.fullmatch(token):
+        return None
+    pipeline = redis_client.pipeline()
+    pipeline.type(token)
+    pipeline.get(token)
+    pipeline.ttl(token)
+    key_type, user_id, ttl = pipeline.execute(raise_on_error=False)
+    if decode(key_type) != "string" or ttl <= 0 or not decode(user_id).isdigit():
+        return None
+    return int(user_id)
+
+
+def get_legacy_auth_user(token):
+    from app.core.models import User as UserModel
+
+    if (user_id := get_legacy_user_id(token)) is not None:
+        if user := UserModel.query.get(user_id):
+            return AuthUser.from_user(user)
+    return None
+
+
+def get_auth_user(token):
+    """AuthUser of the session token or None, served from the session record"""
+    if auth_user := auth_cache.get(token):
+        return auth_user
+    try:
+        record = get_session_record(token)
+        if record:
+            auth_user = AuthUser.from_session_record(record)
+        else:
+            auth_user = get_legacy_auth_user(token)
+    except (KeyError, ValueError, ResponseError):  # not a session record
+        traceback.print_exc()
+        return None
+    if auth_user is not None:
+        auth_cache.set(token, auth_user)
+    return auth_user
+
+
+def get_request_auth_user(request):
+    if auth_header := request.headers.get("Authorization"):
+        return get_auth_user(auth_header)
+    return None
+
+
+def invalidate_session(token):
+    auth_cache.invalidate_token(token)
+    pubsub.publish(AUTH_CACHE_CHANNEL, f"token:{token}")
+
+
+def invalidate_user_sessions(user_id):
+    auth_cache.invalidate_user(user_id)
+    pubsub.publish(AUTH_CACHE_CHANNEL, f"user:{user_id}")
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import traceback
+from contextlib import contextmanager
+
+from app.core.redis import redis_client
+from app.core.redis_lock import acquire_lock, release_lock
+from app.core.variables import (
+    BOOTSTRAP_LOCK_TIME,
+    BOOTSTRAP_READY_TIME,
+    BOOTSTRAP_WAIT_TIME,
+)
+
+
+BOOTSTRAP_LOCK_KEY = "bootstrap_lock"
+BOOTSTRAP_REPORT_KEY = "bootstrap_report"
+READY_POLL_INTERVAL = 0.5
+
+
+def gen_source_version(modules):
+    """Digest of the modules' source, changed tables or indexes get a new one"""
+    digest = hashlib.sha1()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def gen_bootstrap_ready_key(version):
+    # a new deployment or new bootstrap code runs the bootstrap again
+    return f"bootstrap_ready:{os.getenv('DEPLOYMENT_ID', 'default')}:{version}"
+
+
+class StartupReport:
+    """Duration of each startup phase of this process"""
+
+    def __init__(self):
+        self.role = None
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            elapsed_time = time.perf_counter() - start
+            phase = {"name": name, "ms": round(elapsed_time * 1000, 1)}
+            if error:
+                phase["error"] = error
+            self.phases.append(phase)
+
+    def to_dict(self):
+        return {
+            "pid": os.getpid(),
+            "role": self.role,
+            "total_ms": round(sum(phase["ms"] for phase in self.phases), 1),
+            "phases": self.phases,
+        }
+
+    def print(self):
+        print("startup report", json.dumps(self.to_dict()))
+
+
+startup_report = StartupReport()
+
+
+def wait_for_bootstrap_ready(version, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if redis_client.exists(gen_bootstrap_ready_key(version)):
+            return True
+        if not redis_client.exists(BOOTSTRAP_LOCK_KEY):
+            return False  # the leader died or failed, try to lead
+        time.sleep(READY_POLL_INTERVAL)
+    return False
+
+
+def run_bootstrap(report, steps, version):
+    """Run the (name, func) steps in one process per deployment and version
+
+    The process holding the redis lock runs them and sets the readiness flag,
+    the others wait for the flag. Steps failing are reported and skipped as
+    the startup used to do.
+    """
+    ready_key = gen_bootstrap_ready_key(version)
+    while True:
+        if redis_client.exists(ready_key):
+            report.role = report.role or "ready"
+            return
+        if token := acquire_lock(BOOTSTRAP_LOCK_KEY, BOOTSTRAP_LOCK_TIME):
+            break
+        report.role = "follower"
+        with report.phase("wait_for_leader"):
+            if wait_for_bootstrap_ready(version, BOOTSTRAP_WAIT_TIME):
+                return
+        if redis_client.exists(BOOTSTRAP_LOCK_KEY):
+            print("bootstrap leader is still running, starting anyway")
+            return
+
+    report.role = "leader"
+    try:
+        for name, func in steps:
+            try:
+                with report.phase(name):
+                    func()
+            except:
+                traceback.print_exc()
+        redis_client.set(ready_key, 1, ex=BOOTSTRAP_READY_TIME)
+        redis_client.set(BOOTSTRAP_REPORT_KEY, json.dumps(report.to_dict()))
+    finally:
+        release_lock(BOOTSTRAP_LOCK_KEY, token)
+
+
+def get_bootstrap_report():
+    if report := redis_client.get(BOOTSTRAP_REPORT_KEY):
+        return json.loads(report)
+    return None
@@ -0,0 +1,188 @@
+import json
+import traceback
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.variables import BULK_IMPORT_MAX_COUNT, BULK_WRITE_CHUNK_SIZE
+
+
+CREATED = "created"
+UPDATED = "updated"
+INVALID = "invalid"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class BulkImportError(Exception):
+    """The whole upload can't be read, nothing was written"""
+
+
+def read_bulk_entries(request):
+    """Entries of a JSON array or NDJSON body, or of an uploaded file of them
+
+    Returns [(entry, error)], an NDJSON line that isn't JSON is an error of
+    its own entry only.
+    """
+    if file := request.files.get("file"):
+        data = file.read()
+    else:
+        data = request.get_data()
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BulkImportError("Not UTF-8")
+
+    if text.lstrip().startswith("["):
+        try:
+            entries = [(entry, None) for entry in json.loads(text)]
+        except ValueError as e:
+            raise BulkImportError(f"Invalid JSON: {e}")
+    else:
+        entries = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append((json.loads(line), None))
+            except ValueError as e:
+                entries.append((None, f"Invalid JSON: {e}"))
+    if not entries:
+        raise BulkImportError("No entries")
+    if len(entries) > BULK_IMPORT_MAX_COUNT:
+        raise BulkImportError(f"1 to {BULK_IMPORT_MAX_COUNT} entries")
+    return entries
+
+
+def parse_bulk_entry(entry, fields):
+    """Entry as the single create parser would read it, or raise ValueError
+
+    fields: [(name, type, required)], type is str, int or list(of str).
+    Missing fields are None like the parser leaves them.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError("Not an object")
+    result = {}
+    for name, type_, required in fields:
+        value = entry.get(name)
+        if value is None:
+            if required:
+                raise ValueError(f"Missing {name}")
+        elif type_ is str:
+            if not isinstance(value, str):
+                raise ValueError(f"{name} must be a string")
+            if required and not value.strip():
+                raise ValueError(f"Missing {name}")
+        elif type_ is int:
+            if isinstance(value, bool):
+                raise ValueError(f"{name} must be an integer")
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be an integer")
+        elif type_ is list:
+            if not isinstance(value, list) or not all(
+                isinstance(item, str) for item in value
+            ):
+                raise ValueError(f"{name} must be a list of strings")
+        result[name] = value
+    return result
+
+
+def bulk_upsert(collection, items):
+    """Upsert (index, search query, fields) items, unordered and chunked
+
+    Returns {index: (status, error)} of the items.
+    """
+    results = {}
+    for i in range(0, len(items), BULK_WRITE_CHUNK_SIZE):
+        chunk = items[i : i + BULK_WRITE_CHUNK_SIZE]
+        requests = [
+            UpdateOne(search_query, {"$set": fields}, upsert=True)
+            for _, search_query, fields in chunk
+        ]
+        write_errors = {}
+        try:
+            upserted_ids = collection.bulk_write(requests, ordered=False).upserted_ids
+        except BulkWriteError as e:
+            upserted_ids = {
+                upserted["index"]: upserted["_id"]
+                for upserted in e.details.get("upserted", [])
+            }
+            write_errors = {
+                error["index"]: error.get("errmsg")
+                for error in e.details.get("writeErrors", [])
+            }
+        for request_index, (index, _, _) in enumerate(chunk):
+            if request_index in write_errors:
+                results[index] = (FAILED, write_errors[request_index])
+            elif request_index in upserted_ids:
+                results[index] = (CREATED, None)
+            else:
+                results[index] = (UPDATED, None)
+    return results
+
+
+def import_bulk_entries(
+    collection, entries, fields, gen_key, gen_search_query, prepare_entry=None
+):
+    """Validate and upsert the entries, the last one of a repeated key wins
+
+    prepare_entry adds the derived fields to a parsed entry. Returns (per
+    entry results, {key: written entry}).
+    """
+    results = [None] * len(entries)
+    latest = {}
+    for index, (entry, error) in enumerate(entries):
+        if error is None:
+            try:
+                entry = parse_bulk_entry(entry, fields)
+                if prepare_entry is not None:
+                    entry = prepare_entry(entry)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            results[index] = {"index": index, "status": INVALID, "error": error}
+            continue
+        key = gen_key(entry)
+        if key in latest:
+            skipped = latest[key][0]
+            results[skipped] = {
+                "index": skipped,
+                "key": key,
+                "status": SKIPPED,
+                "error": f"Repeated by entry {index}",
+            }
+        latest[key] = (index, entry)
+
+    items = [
+        (index, gen_search_query(entry), entry) for index, entry in latest.values()
+    ]
+    entries_by_index = dict(latest.values())
+    written = {}
+    for index, (status, error) in bulk_upsert(collection, items).items():
+        entry = entries_by_index[index]
+        key = gen_key(entry)
+        results[index] = {"index": index, "key": key, "status": status}
+        if error is not None:
+            results[index]["error"] = error
+        else:
+            written[key] = entry
+    return results, written
+
+
+def summarize_bulk_results(results):
+    summary = {status: 0 for status in (CREATED, UPDATED, INVALID, SKIPPED, FAILED)}
+    for result in results:
+        summary[result["status"]] += 1
+    return {**summary, "items": results}
+
+
+def refresh_after_bulk_import(steps):
+    """Run the (name, func) cache refreshes, a failing one doesn't stop the rest"""
+    for name, func in steps:
+        try:
+            func()
+        except:
+            print(f"bulk import refresh {name} failed")
+            traceback.print_exc()
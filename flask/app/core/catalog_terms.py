@@ -0,0 +1,42 @@
+import json
+
+from app.core import pubsub
+from app.core.mongo_db import mongo, gen_restrict_access_query
+
+
+CATALOG_TERMS_CHANNEL = "catalog_terms"
+
+PHRASAL_VERB = "phrasal_verb"
+IDIOM = "idiom"
+
+
+def load_public_terms():
+    """(kind, term) of every public phrasal verb and idiom"""
+    query = gen_restrict_access_query()
+    for term in mongo.db.phrasal_verbs.distinct("phrasal_verb", query):
+        yield PHRASAL_VERB, term
+    for term in mongo.db.idioms.distinct("expression", query):
+        yield IDIOM, term
+
+
+def publish_term_change(action, kind, terms):
+    """action: 'add' when the terms became public, 'remove' otherwise"""
+    terms = [term for term in terms if term]
+    if not terms:
+        return
+    message = json.dumps({"action": action, "kind": kind, "terms": terms})
+    pubsub.dispatch(CATALOG_TERMS_CHANNEL, message)  # this worker right away
+    pubsub.publish(CATALOG_TERMS_CHANNEL, message)
+
+
+def subscribe_term_changes(index):
+    """index implements add(kind, term), remove(kind, term) and reset()"""
+
+    def handle_message(message):
+        change = json.loads(message)
+        apply = index.add if change["action"] == "add" else index.remove
+        for term in change["terms"]:
+            apply(change["kind"], term)
+
+    pubsub.subscribe(CATALOG_TERMS_CHANNEL, handle_message)
+    pubsub.on_reconnect(index.reset)
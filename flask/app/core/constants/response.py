@@ -2,6 +2,7 @@ status = {
     "SUCCESS": 200,  # GET - DATA OR EMPTY LIST
     "CREATED": 201,  # POST
     "NO_CONTENT": 204,  # DELETE, PUT
+    "NOT_MODIFIED": 304,  # GET - ETAG MATCHED
     "FAIL": 400,  # GENERAIL FAIL - CLIENT ERROR
     "NO_AUTH": 401,  # LOGIN NEEDED
     "FORBIDDEN": 403,  # ADMIN ONLY
@@ -14,6 +15,7 @@ message = {
         "SUCCESS": "성공",  # GET - DATA OR EMPTY LIST
         "CREATED": "생성",  # POST
         "NO_CONTENT": "데이터 없음",  # DELETE, PUT
+        "NOT_MODIFIED": "변경 없음",  # GET - ETAG MATCHED
         "FAIL": "실패",  # GENERAIL FAIL - CLIENT ERROR
         "NO_AUTH": "로그인이 필요합니다.",  # LOGIN NEEDED
         "FORBIDDEN": "접근 권한이 없습니다.",  # ADMIN ONLY
@@ -24,6 +26,7 @@ message = {
         "SUCCESS": "Success",  # GET - DATA OR EMPTY LIST
         "CREATED": "Created",  # POST
         "NO_CONTENT": "No content",  # DELETE, PUT
+        "NOT_MODIFIED": "Not modified",  # GET - ETAG MATCHED
         "FAIL": "Fail",  # GENERAIL FAIL - CLIENT ERROR
         "NO_AUTH": "Please login first",  # LOGIN NEEDED
         "FORBIDDEN": "No permission",  # ADMIN ONLY
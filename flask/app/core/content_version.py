@@ -0,0 +1,40 @@
+import time
+import hashlib
+import traceback
+
+from app.core.redis import redis_client
+
+
+def gen_content_version_key(collection):
+    return f"content_version:{collection}"
+
+
+def gen_initial_version():
+    # Not 0 so that versions restarted after a redis flush can't reuse old etags
+    return int(time.time() * 1000)
+
+
+def get_content_version(collection):
+    key = gen_content_version_key(collection)
+    if version := redis_client.get(key):
+        return int(version)
+    redis_client.set(key, gen_initial_version(), nx=True)
+    return int(redis_client.get(key))
+
+
+def bump_content_version(collection):
+    key = gen_content_version_key(collection)
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.set(key, gen_initial_version(), nx=True)
+        pipeline.incr(key)
+        return pipeline.execute()[-1]
+    except:
+        traceback.print_exc()
+        return None
+
+
+def gen_etag(collection, version, variant):
+    """Strong etag of a response variant(path, query, role) of a collection version"""
+    digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:16]
+    return f"{collection}-{version}-{digest}"
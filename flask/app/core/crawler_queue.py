@@ -0,0 +1,408 @@
+import time
+import shlex
+import subprocess
+import traceback
+from threading import Event, Lock, Thread
+
+import paramiko
+
+from app.core.redis import redis_client
+from app.core.variables import (
+    CRAWLER_WORKER_COUNT,
+    CRAWLER_MAX_RUNNING,
+    CRAWLER_MAX_ATTEMPTS,
+    CRAWLER_RETRY_BASE_TIME,
+    CRAWLER_RETRY_MAX_TIME,
+    CRAWLER_JOB_LEASE_TIME,
+    CRAWLER_JOB_KEEP_TIME,
+    CRAWLER_POLL_INTERVAL,
+    CRAWLER_COMMAND_TIMEOUT,
+    CRAWLER_RECENT_JOB_COUNT,
+)
+
+
+CRAWLER_QUEUE_KEY = "crawler_jobs"  # keywords ready to run, oldest first
+CRAWLER_DELAYED_KEY = "crawler_jobs_delayed"  # keyword -> time of the retry
+CRAWLER_RUNNING_KEY = "crawler_jobs_running"  # keyword -> lease deadline
+CRAWLER_INDEX_KEY = "crawler_jobs_index"  # keyword -> last update time
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+SSH_KEEPALIVE_INTERVAL = 30
+SSH_READ_SIZE = 32768
+SSH_POLL_INTERVAL = 0.2
+# seconds the crawler host's timeout waits after TERM before KILL, the
+# executors give up on the command once both passed
+COMMAND_KILL_TIME = 10
+COMMAND_DEADLINE = CRAWLER_COMMAND_TIMEOUT + COMMAND_KILL_TIME * 2
+
+
+def gen_crawler_job_key(keyword):
+    return f"crawler_job:{keyword}"
+
+
+def decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+# Queues the keywords whose job isn't already waiting or running, returns
+# how many were queued. A job of a worker that died is requeued by CLAIM.
+# KEYS: queue, index, ARGV: now, keep time, keywords...
+ENQUEUE_SCRIPT = """
+local queued = 0
+for i = 3, #ARGV do
+    local key = "crawler_job:" .. ARGV[i]
+    local status = redis.call("HGET", key, "status")
+    if status ~= "queued" and status ~= "running" and status ~= "retrying" then
+        redis.call("DEL", key)
+        redis.call("HSET", key, "status", "queued", "attempts", 0,
+            "enqueued_at", ARGV[1], "updated_at", ARGV[1])
+        redis.call("EXPIRE", key, ARGV[2])
+        redis.call("RPUSH", KEYS[1], ARGV[i])
+        redis.call("ZADD", KEYS[2], ARGV[1], ARGV[i])
+        queued = queued + 1
+    end
+end
+return queued
+"""
+
+# Moves the due retries and the expired leases(their worker died) to the
+# queue, then takes the next keyword when fewer than the max running jobs
+# are leased. The attempts of the claim are its token for FINISH_SCRIPT.
+# KEYS: queue, delayed, running, index
+# ARGV: now, lease time, max running, max attempts, keep time
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+for _, keyword in ipairs(redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now)) do
+    redis.call("ZREM", KEYS[2], keyword)
+    redis.call("RPUSH", KEYS[1], keyword)
+    redis.call("HSET", "crawler_job:" .. keyword, "status", "queued")
+end
+for _, keyword in ipairs(redis.call("ZRANGEBYSCORE", KEYS[3], "-inf", now)) do
+    local key = "crawler_job:" .. keyword
+    redis.call("ZREM", KEYS[3], keyword)
+    if tonumber(redis.call("HGET", key, "attempts") or 0) >= tonumber(ARGV[4]) then
+        redis.call("HSET", key, "status", "failed", "error", "lease expired",
+            "updated_at", now)
+        redis.call("EXPIRE", key, ARGV[5])
+    else
+        redis.call("LPUSH", KEYS[1], keyword)
+        redis.call("HSET", key, "status", "queued", "error", "lease expired",
+            "updated_at", now)
+    end
+    redis.call("ZADD", KEYS[4], now, keyword)
+end
+if redis.call("ZCARD", KEYS[3]) >= tonumber(ARGV[3]) then
+    return nil
+end
+local keyword = redis.call("LPOP", KEYS[1])
+if not keyword then
+    return nil
+end
+local key = "crawler_job:" .. keyword
+redis.call("ZADD", KEYS[3], now + tonumber(ARGV[2]), keyword)
+local attempts = redis.call("HINCRBY", key, "attempts", 1)
+redis.call("HSET", key, "status", "running", "updated_at", now)
+return {keyword, attempts}
+"""
+
+
+# Records the result of a claim unless its lease was lost: the lease expired
+# and the job was requeued, failed or claimed again by another worker.
+# KEYS: running, delayed, index, job
+# ARGV: keyword, attempts of the claim, now, status, error, retry at, keep time
+FINISH_SCRIPT = """
+if not redis.call("ZSCORE", KEYS[1], ARGV[1])
+    or redis.call("HGET", KEYS[4], "attempts") ~= ARGV[2] then
+    return 0
+end
+redis.call("ZREM", KEYS[1], ARGV[1])
+redis.call("HSET", KEYS[4], "status", ARGV[4], "updated_at", ARGV[3],
+    "error", ARGV[5])
+if ARGV[4] == "retrying" then
+    redis.call("ZADD", KEYS[2], ARGV[6], ARGV[1])
+    redis.call("HSET", KEYS[4], "retry_at", ARGV[6])
+end
+redis.call("EXPIRE", KEYS[4], ARGV[7])
+redis.call("ZADD", KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+
+
+def read_channel(channel, deadline):
+    """(exit status, stdout, stderr) of the channel's command
+
+    The timeout of exec_command only bounds each read, this bounds the whole
+    command and raises TimeoutError past the deadline.
+    """
+    stdout, stderr = [], []
+    while True:
+        if channel.recv_ready():
+            stdout.append(channel.recv(SSH_READ_SIZE))
+        elif channel.recv_stderr_ready():
+            stderr.append(channel.recv_stderr(SSH_READ_SIZE))
+        elif channel.exit_status_ready():
+            return channel.recv_exit_status(), b"".join(stdout), b"".join(stderr)
+        elif time.monotonic() > deadline:
+            channel.close()
+            raise TimeoutError(f"no exit in {COMMAND_DEADLINE}s")
+        else:
+            time.sleep(SSH_POLL_INTERVAL)
+
+
+class SSHExecutor:
+    """Runs commands on the crawler host over one persistent transport
+
+    The transport is opened on first use and shared by the workers, each
+    command opens a channel on it instead of a new connection.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.client = None
+        self.lock = Lock()
+
+    def get_client(self):
+        with self.lock:
+            transport = self.client.get_transport() if self.client else None
+            if transport is None or not transport.is_active():
+                self.close()
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                client.connect(
+                    self.config.SSH_HOST,
+                    self.config.SSH_PORT,
+                    self.config.SSH_USER,
+                    self.config.SSH_PASSWORD,
+                )
+                client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+                self.client = client
+            return self.client
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def reset(self, client):
+        """Close the failed client so the next command reconnects
+
+        Left open while its transport is still up or another worker already
+        replaced it, the other commands keep running on their channels.
+        """
+        with self.lock:
+            if client is not self.client:
+                return
+            transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                self.close()
+
+    def run(self, command):
+        """Return (exit status, stdout, stderr) of the command"""
+        deadline = time.monotonic() + COMMAND_DEADLINE
+        client = self.get_client()
+        try:
+            _, stdout, _ = client.exec_command(command, timeout=COMMAND_DEADLINE)
+            exit_status, result_stdout, result_stderr = read_channel(
+                stdout.channel, deadline
+            )
+        except TimeoutError:  # read_channel closed only this command's channel
+            raise
+        except (paramiko.SSHException, EOFError, OSError):
+            self.reset(client)
+            raise
+        return (
+            exit_status,
+            result_stdout.decode("utf-8"),
+            result_stderr.decode("utf-8"),
+        )
+
+
+class LocalExecutor:
+    """Runs the commands on this host, a stand-in of the crawler host for tests"""
+
+    def __init__(self, config=None):
+        self.commands = []
+
+    def run(self, command):
+        self.commands.append(command)
+        result = subprocess.run(
+            shlex.split(command),
+            capture_output=True,
+            timeout=COMMAND_DEADLINE,
+        )
+        return (
+            result.returncode,
+            result.stdout.decode("utf-8"),
+            result.stderr.decode("utf-8"),
+        )
+
+
+executors = {"ssh": SSHExecutor, "local": LocalExecutor}
+
+
+def gen_crawler_command(config, keyword):
+    """Command of the crawl, killed on the crawler host past the timeout"""
+    return (
+        f"timeout -k {COMMAND_KILL_TIME} {CRAWLER_COMMAND_TIMEOUT} "
+        f"{config.CRAWLER} {shlex.quote(keyword)} phrasal_verbs server"
+    )
+
+
+def gen_retry_wait_time(attempts):
+    return min(CRAWLER_RETRY_BASE_TIME * 2 ** (attempts - 1), CRAWLER_RETRY_MAX_TIME)
+
+
+def enqueue_crawler_jobs(keywords):
+    """Queue a crawl per keyword, skipping the ones waiting or running"""
+    keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+    if not keywords:
+        return 0
+    try:
+        return redis_client.eval(
+            ENQUEUE_SCRIPT,
+            2,
+            CRAWLER_QUEUE_KEY,
+            CRAWLER_INDEX_KEY,
+            int(time.time()),
+            CRAWLER_JOB_KEEP_TIME,
+            *keywords,
+        )
+    except:
+        traceback.print_exc()
+        return 0
+
+
+def claim_crawler_job():
+    """(keyword, attempts) of the next job or None"""
+    job = redis_client.eval(
+        CLAIM_SCRIPT,
+        4,
+        CRAWLER_QUEUE_KEY,
+        CRAWLER_DELAYED_KEY,
+        CRAWLER_RUNNING_KEY,
+        CRAWLER_INDEX_KEY,
+        int(time.time()),
+        CRAWLER_JOB_LEASE_TIME,
+        CRAWLER_MAX_RUNNING,
+        CRAWLER_MAX_ATTEMPTS,
+        CRAWLER_JOB_KEEP_TIME,
+    )
+    if job is None:
+        return None
+    return decode(job[0]), int(job[1])
+
+
+def finish_crawler_job(keyword, attempts, error=None):
+    """Mark the job done, or schedule its retry until the attempts run out
+
+    Returns False when the claim lost its lease, its result is dropped.
+    """
+    now = int(time.time())
+    retry_at = ""
+    if error is None:
+        status = DONE
+    elif attempts < CRAWLER_MAX_ATTEMPTS:
+        status = RETRYING
+        retry_at = now + gen_retry_wait_time(attempts)
+    else:
+        status = FAILED
+    finished = redis_client.eval(
+        FINISH_SCRIPT,
+        4,
+        CRAWLER_RUNNING_KEY,
+        CRAWLER_DELAYED_KEY,
+        CRAWLER_INDEX_KEY,
+        gen_crawler_job_key(keyword),
+        keyword,
+        attempts,
+        now,
+        status,
+        error or "",
+        retry_at,
+        CRAWLER_JOB_KEEP_TIME,
+    )
+    if not finished:
+        print(f"crawler job {keyword}({attempts}) lost its lease, result dropped")
+    return bool(finished)
+
+
+def run_crawler_job(executor, config, keyword, attempts):
+    error = None
+    try:
+        exit_status, _, stderr = executor.run(gen_crawler_command(config, keyword))
+        if exit_status != 0:
+            error = f"exit status {exit_status}: {stderr.strip()[-500:]}"
+    except Exception as e:
+        traceback.print_exc()
+        error = repr(e)
+    finish_crawler_job(keyword, attempts, error)
+
+
+def crawler_worker_loop(executor, config, stop_event):
+    while not stop_event.is_set():
+        try:
+            if job := claim_crawler_job():
+                run_crawler_job(executor, config, *job)
+                continue
+        except:
+            traceback.print_exc()
+        stop_event.wait(CRAWLER_POLL_INTERVAL)
+
+
+def crawler_workers_job(worker_count=CRAWLER_WORKER_COUNT):
+    """Start the worker threads of this process, returns their stop event
+
+    Every process runs its workers, CLAIM_SCRIPT keeps the jobs running at
+    once across the processes under CRAWLER_MAX_RUNNING.
+    """
+    from app import config
+
+    executor = executors[config.CRAWLER_EXECUTOR](config)
+    stop_event = Event()
+    for _ in range(worker_count):
+        thread = Thread(
+            target=crawler_worker_loop, args=(executor, config, stop_event)
+        )
+        thread.daemon = True
+        thread.start()
+    return stop_event
+
+
+def get_crawler_job(keyword):
+    job = redis_client.hgetall(gen_crawler_job_key(keyword))
+    if not job:
+        return None
+    return {"keyword": keyword, **{decode(k): decode(v) for k, v in job.items()}}
+
+
+def get_crawler_jobs_status(keyword=None):
+    """Queue lengths and the recently updated jobs, or the job of the keyword"""
+    if keyword is not None:
+        return get_crawler_job(keyword)
+    pipeline = redis_client.pipeline()
+    pipeline.llen(CRAWLER_QUEUE_KEY)
+    pipeline.zcard(CRAWLER_DELAYED_KEY)
+    pipeline.zcard(CRAWLER_RUNNING_KEY)
+    pipeline.zrevrange(CRAWLER_INDEX_KEY, 0, CRAWLER_RECENT_JOB_COUNT - 1)
+    queued, retrying, running, keywords = pipeline.execute()
+    jobs = []
+    expired = []
+    for keyword in (decode(keyword) for keyword in keywords):
+        if job := get_crawler_job(keyword):
+            jobs.append(job)
+        else:
+            expired.append(keyword)
+    if expired:
+        redis_client.zrem(CRAWLER_INDEX_KEY, *expired)
+    return {
+        "queued": queued,
+        "retrying": retrying,
+        "running": running,
+        "max_running": CRAWLER_MAX_RUNNING,
+        "recent_jobs": jobs,
+    }
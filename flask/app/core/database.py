@@ -1,10 +1,118 @@
+import os
+import time
+from threading import Lock
+
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from flask_sqlalchemy import SQLAlchemy, declarative_base
 
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = Lock()
+        self.wait_count = 0
+        self.wait_total_time = 0.0
+        self.wait_max_time = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_time = time.perf_counter() - start
+            with self.wait_lock:
+                self.wait_count += 1
+                self.wait_total_time += wait_time
+                self.wait_max_time = max(self.wait_max_time, wait_time)
+
+
+class EngineRegistry:
+    """One engine(and so one pool) per database url in the process
+
+    A forked child(gunicorn worker of a preloaded app) must not share the
+    parent's connections, so its pools are replaced right after the fork
+    without closing the parent's sockets.
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.session_factories = {}
+        self.lock = Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def reset_after_fork(self):
+        self.lock = Lock()  # could have been held by another thread
+        for engine in self.engines.values():
+            engine.pool = engine.pool.recreate()
+        self.session_factories.clear()
+
+    def get_engine(self, url, engine_options=None):
+        url = str(url)
+        with self.lock:
+            if (engine := self.engines.get(url)) is None:
+                options = {"poolclass": TimedQueuePool, **(engine_options or {})}
+                engine = create_engine(url, **options)
+                self.engines[url] = engine
+            return engine
+
+    def get_session_factory(self, url, engine_options=None):
+        engine = self.get_engine(url, engine_options)
+        with self.lock:
+            if (session_factory := self.session_factories.get(str(url))) is None:
+                session_factory = scoped_session(sessionmaker(bind=engine))
+                self.session_factories[str(url)] = session_factory
+            return session_factory
+
+    def get_stats(self):
+        with self.lock:
+            return [
+                {"url": repr(make_url(url)), **get_pool_stats(engine.pool)}
+                for url, engine in self.engines.items()
+            ]
+
+
+def get_pool_stats(pool):
+    stats = {"pid": os.getpid(), "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, TimedQueuePool):
+        with pool.wait_lock:
+            count = pool.wait_count
+            stats.update(
+                checkouts=count,
+                wait_avg_ms=round(pool.wait_total_time / count * 1000, 3)
+                if count
+                else None,
+                wait_max_ms=round(pool.wait_max_time * 1000, 3),
+            )
+    return stats
+
+
+engine_registry = EngineRegistry()
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy taking its engines from the process wide registry"""
+
+    def create_engine(self, sa_url, engine_opts):
+        return engine_registry.get_engine(sa_url, engine_opts)
+
+
 Base = declarative_base()
-db = SQLAlchemy(model_class=Base)
+db = PooledSQLAlchemy(model_class=Base)
 
 metadata = Base.metadata
 
@@ -12,6 +120,6 @@ metadata = Base.metadata
 def get_db_session():
     from app import config
 
-    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
-    session_factory = sessionmaker(bind=engine)
-    return scoped_session(session_factory)
+    return engine_registry.get_session_factory(
+        config.SQLALCHEMY_DATABASE_URI, config.SQLALCHEMY_ENGINE_OPTIONS
+    )
@@ -0,0 +1,190 @@
+from threading import Lock
+
+from app.core.catalog_terms import (
+    PHRASAL_VERB,
+    IDIOM,
+    load_public_terms,
+    subscribe_term_changes,
+)
+
+
+def get_edit_distance(source, target):
+    """Levenshtein distance"""
+    if len(source) < len(target):
+        source, target = target, source
+    previous = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, 1):
+        current = [i]
+        for j, target_char in enumerate(target, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (source_char != target_char),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+def gen_max_edit_distance(term):
+    return 1 if len(term) <= 5 else 2
+
+
+def gen_deletes(word, max_distance):
+    """word and every string made by deleting up to max_distance characters"""
+    deletes = {word}
+    variants = {word}
+    for _ in range(max_distance):
+        variants = {
+            variant[:i] + variant[i + 1 :]
+            for variant in variants
+            for i in range(len(variant))
+        }
+        deletes |= variants
+    return deletes
+
+
+class TermIndex:
+    """Symmetric delete index over the words of the terms
+
+    Two words within distance k share a string made by deleting up to k
+    characters from each, so a query word only needs a few dict lookups to
+    find its close words. The terms containing the close words of the most
+    selective query word are then compared with the whole query.
+    """
+
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self.word_terms = {}
+        self.deletes = {}
+
+    def add(self, term):
+        for word in set(term.split()):
+            if word not in self.word_terms:
+                self.word_terms[word] = set()
+                for variant in gen_deletes(word, self.max_distance):
+                    self.deletes.setdefault(variant, set()).add(word)
+            self.word_terms[word].add(term)
+
+    def remove(self, term):
+        for word in set(term.split()):
+            terms = self.word_terms.get(word)
+            if terms is None:
+                continue
+            terms.discard(term)
+            if terms:
+                continue
+            del self.word_terms[word]
+            for variant in gen_deletes(word, self.max_distance):
+                words = self.deletes.get(variant)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self.deletes[variant]
+
+    def get_close_words(self, word, max_distance):
+        candidates = set()
+        for variant in gen_deletes(word, max_distance):
+            candidates |= self.deletes.get(variant, set())
+        return [
+            candidate
+            for candidate in candidates
+            if abs(len(candidate) - len(word)) <= max_distance
+            and get_edit_distance(word, candidate) <= max_distance
+        ]
+
+    def search(self, term, max_distance):
+        """Return [(distance, term)] within max_distance"""
+        max_distance = min(max_distance, self.max_distance)
+        close_word_sets = []
+        for word in set(term.split()):
+            # short words within 2 edits of anything would match most terms
+            word_distance = min(max_distance, max(1, len(word) - 2))
+            close_words = set(self.get_close_words(word, word_distance))
+            if not close_words:
+                return []  # every query word must be close to a word of the term
+            close_word_sets.append(close_words)
+        if not close_word_sets:
+            return []
+
+        # walk the postings of the most selective query word
+        selective_words = min(
+            close_word_sets,
+            key=lambda words: sum(len(self.word_terms[word]) for word in words),
+        )
+        result = []
+        checked = set()
+        for word in selective_words:
+            for candidate in self.word_terms[word]:
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if abs(len(candidate) - len(term)) > max_distance:
+                    continue
+                words = candidate.split()
+                if not all(
+                    any(word in close_words for word in words)
+                    for close_words in close_word_sets
+                ):
+                    continue
+                distance = get_edit_distance(term, candidate)
+                if distance <= max_distance:
+                    result.append((distance, candidate))
+        return result
+
+
+class FuzzyIndex:
+    """Per worker indexes of public phrasal verbs and idioms(case folded)"""
+
+    def __init__(self):
+        self.indexes = {}
+        self.display_terms = {}
+        self.loaded = False
+        self.lock = Lock()
+
+    def reset(self):
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded:
+            self.load_terms(load_public_terms())
+
+    def load_terms(self, terms):
+        """Build the indexes from (kind, term) pairs"""
+        with self.lock:
+            if self.loaded:
+                return
+            self.indexes = {PHRASAL_VERB: TermIndex(), IDIOM: TermIndex()}
+            self.display_terms = {}
+            for kind, term in terms:
+                self._add(kind, term)
+            self.loaded = True
+
+    def add(self, kind, term):
+        with self.lock:
+            if self.loaded:
+                self._add(kind, term)
+
+    def remove(self, kind, term):
+        with self.lock:
+            if self.loaded:
+                self.indexes[kind].remove(term.casefold())
+
+    def _add(self, kind, term):
+        folded = term.casefold()
+        self.display_terms[folded] = term
+        self.indexes[kind].add(folded)
+
+    def search(self, kind, term, limit=5):
+        """Closest public terms, nearest first"""
+        if not self.loaded:
+            self.load()
+        folded = " ".join(term.casefold().split())
+        with self.lock:
+            matches = self.indexes[kind].search(folded, gen_max_edit_distance(folded))
+        return [self.display_terms[match] for _, match in sorted(matches)[:limit]]
+
+
+fuzzy_index = FuzzyIndex()
+subscribe_term_changes(fuzzy_index)
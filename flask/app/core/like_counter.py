@@ -0,0 +1,555 @@
+import time
+import traceback
+from threading import Thread, Event
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from app.core.redis import redis_client
+from app.core.redis_lock import acquire_lock, release_lock
+from app.core.mongo_db import (
+    mongo,
+    gen_collection_active_like_query,
+    gen_in_query,
+    gen_user_like_query,
+    encode_page_cursor,
+    decode_page_cursor,
+)
+from app.core.variables import (
+    LIKE_COUNT_RECONCILE_TIME,
+    LIKE_FLUSH_INTERVAL,
+    LIKE_FLUSH_BATCH_SIZE,
+    LIKE_FLUSH_LOCK_TIME,
+    LIKED_IDS_CACHE_TIME,
+)
+
+
+LIKE_TOGGLES_STREAM_KEY = "like_toggles"
+LIKE_FLUSH_LOCK_KEY = "like_flush_lock"
+LIKE_COUNT_RECONCILE_LOCK_KEY = "like_count_reconcile_lock"
+LIKE_FLUSH_LOCK_WAIT_INTERVAL = 0.1
+# key of the like's item id on the joined items, dropped before they're sent
+LIKED_ID = "_likedId"
+
+
+# like collection name: field of the liked item's id
+LIKE_FIELDS = {
+    "user_like_phrasal_verb": "phrasalVerbId",
+    "user_like_idiom": "idiomId",
+}
+
+# like collection name: collection of the liked items
+LIKE_TARGETS = {
+    "user_like_phrasal_verb": "phrasal_verbs",
+    "user_like_idiom": "idioms",
+}
+
+
+def gen_like_count_key(like_collection):
+    return f"like_count:{like_collection.name}"
+
+
+def gen_like_count_ready_key(like_collection):
+    return f"like_count_ready:{like_collection.name}"
+
+
+def gen_like_count_touched_key(like_collection):
+    return f"like_count_touched:{like_collection.name}"
+
+
+def gen_pending_likes_key(like_collection, user_id):
+    return f"like_pending:{like_collection.name}:{user_id}"
+
+
+def gen_liked_ids_key(like_collection, user_id):
+    return f"liked_ids:{like_collection.name}:{user_id}"
+
+
+def gen_liked_ids_ready_key(like_collection, user_id):
+    return f"liked_ids_ready:{like_collection.name}:{user_id}"
+
+
+def decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+# Sets the pending state, moves the counter when the active state changes and
+# appends the toggle to the stream in one step. The user's liked ids follow
+# while loaded and expire with their ready flag, a running reconcile keeps the
+# touched items' counters.
+# KEYS: pending likes, like counts, stream, liked ids, liked ids ready, touched
+# ARGV: item id, active, active stored in mongodb, collection name, user id
+TOGGLE_LIKE_SCRIPT = """
+local previous = redis.call("HGET", KEYS[1], ARGV[1]) or ARGV[3]
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+local was_active = previous == "1" and 1 or 0
+local is_active = ARGV[2] == "1" and 1 or 0
+if was_active ~= is_active then
+    redis.call("HINCRBY", KEYS[2], ARGV[1], is_active - was_active)
+end
+redis.call("SADD", KEYS[6], ARGV[1])
+local ready_ttl = redis.call("PTTL", KEYS[5])
+if ready_ttl > 0 then
+    if is_active == 1 then
+        redis.call("SADD", KEYS[4], ARGV[1])
+        redis.call("PEXPIRE", KEYS[4], ready_ttl)
+    else
+        redis.call("SREM", KEYS[4], ARGV[1])
+    end
+end
+redis.call(
+    "XADD", KEYS[3], "*",
+    "collection", ARGV[4], "userId", ARGV[5], "itemId", ARGV[1], "active", ARGV[2]
+)
+return redis.call("XLEN", KEYS[3])
+"""
+
+# Sets the recounted counters except the ones of the items toggled since the
+# recount read the pending toggles, their counters already moved past it.
+# KEYS: like counts, recounted, touched
+MERGE_RECOUNTED_LIKES_SCRIPT = """
+local touched = {}
+for _, item_id in ipairs(redis.call("SMEMBERS", KEYS[3])) do
+    touched[item_id] = true
+end
+local recounted = redis.call("HGETALL", KEYS[2])
+for i = 1, #recounted, 2 do
+    if not touched[recounted[i]] then
+        redis.call("HSET", KEYS[1], recounted[i], recounted[i + 1])
+    end
+end
+for _, item_id in ipairs(redis.call("HKEYS", KEYS[1])) do
+    if not touched[item_id] and redis.call("HEXISTS", KEYS[2], item_id) == 0 then
+        redis.call("HDEL", KEYS[1], item_id)
+    end
+end
+redis.call("DEL", KEYS[2])
+"""
+
+# Drops a flushed pending state unless it was toggled again meanwhile
+# KEYS: pending likes, ARGV: item id, flushed active
+DELETE_FLUSHED_LIKE_SCRIPT = """
+if redis.call("HGET", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("HDEL", KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+flush_event = Event()
+
+
+def get_stored_like_active(like_collection, user_id, item_id):
+    field = LIKE_FIELDS[like_collection.name]
+    like = like_collection.find_one({"userId": user_id, field: item_id}, {"active": 1})
+    return like.get("active") if like else None
+
+
+def get_user_like_active(like_collection, user_id, item_id):
+    """1 when the user likes the item, pending toggles included"""
+    pending_key = gen_pending_likes_key(like_collection, user_id)
+    if (active := redis_client.hget(pending_key, item_id)) is not None:
+        return 1 if decode(active) == "1" else 0
+    return 1 if get_stored_like_active(like_collection, user_id, item_id) == 1 else 0
+
+
+def get_pending_likes(like_collection, user_id):
+    """{item id: active} of the user's toggles not flushed to mongodb yet"""
+    pending_key = gen_pending_likes_key(like_collection, user_id)
+    return {
+        decode(item_id): int(decode(active))
+        for item_id, active in redis_client.hgetall(pending_key).items()
+    }
+
+
+def update_user_like(like_collection, user_id, item_id, active):
+    """Buffer a like toggle, the flusher writes it to mongodb later
+
+    The counter only moves when the active state really changes.
+    """
+    pending_key = gen_pending_likes_key(like_collection, user_id)
+    stored_active = None
+    if not redis_client.hexists(pending_key, item_id):
+        stored_active = get_stored_like_active(like_collection, user_id, item_id)
+    pending_count = redis_client.eval(
+        TOGGLE_LIKE_SCRIPT,
+        6,
+        pending_key,
+        gen_like_count_key(like_collection),
+        LIKE_TOGGLES_STREAM_KEY,
+        gen_liked_ids_key(like_collection, user_id),
+        gen_liked_ids_ready_key(like_collection, user_id),
+        gen_like_count_touched_key(like_collection),
+        item_id,
+        str(active),
+        str(stored_active),
+        like_collection.name,
+        user_id,
+    )
+    if pending_count >= LIKE_FLUSH_BATCH_SIZE:
+        flush_event.set()
+
+
+def write_pending_likes(pending_likes):
+    """Write (collection name, user id, item id, active) states to mongodb
+
+    Each pending state is dropped afterwards unless it was toggled again.
+    """
+    operations = {}
+    pending_likes = list(pending_likes)
+    for name, user_id, item_id, active in pending_likes:
+        search_query = {"userId": user_id, LIKE_FIELDS[name]: item_id}
+        user_like = {**search_query, "active": int(active)}
+        operations.setdefault(name, []).append(
+            ReplaceOne(search_query, user_like, upsert=True)
+        )
+    for name, requests in operations.items():
+        mongo.db[name].bulk_write(requests, ordered=False)
+
+    pipeline = redis_client.pipeline()
+    for name, user_id, item_id, active in pending_likes:
+        pending_key = gen_pending_likes_key(mongo.db[name], user_id)
+        pipeline.eval(DELETE_FLUSHED_LIKE_SCRIPT, 1, pending_key, item_id, active)
+    pipeline.execute()
+
+
+def flush_like_toggles():
+    """Write the buffered toggles to mongodb, the latest state per user and item"""
+    if not (token := acquire_lock(LIKE_FLUSH_LOCK_KEY, LIKE_FLUSH_LOCK_TIME)):
+        return 0
+    try:
+        entries = redis_client.xrange(
+            LIKE_TOGGLES_STREAM_KEY, count=LIKE_FLUSH_BATCH_SIZE
+        )
+        if not entries:
+            return 0
+        toggles = set()
+        for _, fields in entries:
+            fields = {decode(key): decode(value) for key, value in fields.items()}
+            toggles.add((fields["collection"], int(fields["userId"]), fields["itemId"]))
+
+        # the pending state is the latest one, a missing state was already
+        # flushed or belongs to a deleted user
+        toggles = list(toggles)
+        pipeline = redis_client.pipeline()
+        for name, user_id, item_id in toggles:
+            pipeline.hget(gen_pending_likes_key(mongo.db[name], user_id), item_id)
+        write_pending_likes(
+            (name, user_id, item_id, decode(active))
+            for (name, user_id, item_id), active in zip(toggles, pipeline.execute())
+            if active is not None
+        )
+        entry_ids = [entry_id for entry_id, _ in entries]
+        redis_client.xdel(LIKE_TOGGLES_STREAM_KEY, *entry_ids)
+        return len(entries)
+    finally:
+        release_lock(LIKE_FLUSH_LOCK_KEY, token)
+
+
+def flush_like_toggles_loop():
+    while True:
+        flush_event.wait(LIKE_FLUSH_INTERVAL)
+        flush_event.clear()
+        try:
+            while flush_like_toggles() >= LIKE_FLUSH_BATCH_SIZE:
+                pass
+        except:
+            traceback.print_exc()
+
+
+def flush_like_toggles_job():
+    thread = Thread(target=flush_like_toggles_loop)
+    thread.daemon = True
+    thread.start()
+
+
+def get_like_count(like_collection, item_id):
+    pipeline = redis_client.pipeline()
+    pipeline.exists(gen_like_count_ready_key(like_collection))
+    pipeline.hget(gen_like_count_key(like_collection), item_id)
+    is_ready, count = pipeline.execute()
+    if is_ready:
+        return int(count or 0)
+
+    field = LIKE_FIELDS[like_collection.name]
+    query = gen_collection_active_like_query(field_key=field, field_value=item_id)
+    return like_collection.count_documents(query)
+
+
+def get_like_counts(like_collection, item_ids):
+    """{item id: active like count} of many items"""
+    pipeline = redis_client.pipeline()
+    pipeline.exists(gen_like_count_ready_key(like_collection))
+    pipeline.hmget(gen_like_count_key(like_collection), item_ids)
+    is_ready, counts = pipeline.execute()
+    if is_ready:
+        return {
+            item_id: int(count or 0) for item_id, count in zip(item_ids, counts)
+        }
+
+    field = LIKE_FIELDS[like_collection.name]
+    query = [
+        {"$match": {field: {"$in": item_ids}, "active": 1}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]
+    counts = {item_id: 0 for item_id in item_ids}
+    for item in like_collection.aggregate(query):
+        counts[item["_id"]] = item["count"]
+    return counts
+
+
+def get_user_active_like_ids(like_collection, user_id, item_ids):
+    field = LIKE_FIELDS[like_collection.name]
+    query = {"userId": user_id, "active": 1, field: {"$in": item_ids}}
+    active_ids = {like[field] for like in like_collection.find(query, {field: 1})}
+    pending_key = gen_pending_likes_key(like_collection, user_id)
+    for item_id, active in zip(item_ids, redis_client.hmget(pending_key, item_ids)):
+        if active is not None:
+            if decode(active) == "1":
+                active_ids.add(item_id)
+            else:
+                active_ids.discard(item_id)
+    return active_ids
+
+
+def get_likes(like_collection, user_id, item_ids):
+    """{item id: {"count": active like count, "active": 1 when the user likes it}}"""
+    counts = get_like_counts(like_collection, item_ids)
+    active_ids = get_user_active_like_ids(like_collection, user_id, item_ids)
+    return {
+        item_id: {
+            "count": counts[item_id],
+            "active": 1 if item_id in active_ids else 0,
+        }
+        for item_id in item_ids
+    }
+
+
+def load_liked_ids(like_collection, user_id):
+    """Cache the ids of the items the user likes, pending toggles included"""
+    field = LIKE_FIELDS[like_collection.name]
+    query = {"userId": user_id, "active": 1}
+    liked_ids = {like[field] for like in like_collection.find(query, {field: 1})}
+    for item_id, active in get_pending_likes(like_collection, user_id).items():
+        if active == 1:
+            liked_ids.add(item_id)
+        else:
+            liked_ids.discard(item_id)
+    key = gen_liked_ids_key(like_collection, user_id)
+    pipeline = redis_client.pipeline()
+    pipeline.delete(key)
+    if liked_ids:
+        pipeline.sadd(key, *liked_ids)
+        pipeline.expire(key, LIKED_IDS_CACHE_TIME)
+    pipeline.set(
+        gen_liked_ids_ready_key(like_collection, user_id), 1, ex=LIKED_IDS_CACHE_TIME
+    )
+    pipeline.execute()
+    return liked_ids
+
+
+def get_user_like_count(like_collection, user_id):
+    if redis_client.exists(gen_liked_ids_ready_key(like_collection, user_id)):
+        return redis_client.scard(gen_liked_ids_key(like_collection, user_id))
+    return len(load_liked_ids(like_collection, user_id))
+
+
+def find_user_liked_items(
+    like_collection, user_id, return_fields=None, limit=None, after=None
+):
+    """Keyset page of the items the user likes, sorted by the item _id
+
+    Returns (items, cursor of the next page or None). One aggregation pages
+    the likes, with the pending toggles laid over them, before the items are
+    joined with $lookup. Items deleted since they were liked drop out of the
+    page, the cursor still follows the likes.
+    """
+    field = LIKE_FIELDS[like_collection.name]
+    target = LIKE_TARGETS[like_collection.name]
+    after_id = "" if after is None else str(decode_page_cursor(after))
+    pending_likes = get_pending_likes(like_collection, user_id)
+    # likes toggled since the last flush are read from the pending states,
+    # the liked ones that aren't in mongodb yet come from their items
+    query = [
+        {
+            "$match": {
+                **gen_user_like_query(user_id),
+                field: {"$gt": after_id, "$nin": list(pending_likes)},
+            }
+        },
+        {"$project": {"_id": 0, field: 1}},
+    ]
+    pending_ids = [
+        ObjectId(item_id)
+        for item_id, active in pending_likes.items()
+        if active and item_id > after_id and ObjectId.is_valid(item_id)
+    ]
+    if pending_ids:
+        query.append(
+            {
+                "$unionWith": {
+                    "coll": target,
+                    "pipeline": [
+                        {"$match": gen_in_query(field="_id", values=pending_ids)},
+                        {"$project": {"_id": 0, field: {"$toString": "$_id"}}},
+                    ],
+                }
+            }
+        )
+    query.append({"$sort": {field: 1}})
+    if limit is not None:
+        query.append({"$limit": limit + 1})
+    # ids that aren't ObjectIds match nothing instead of failing the query
+    item_id = {"$convert": {"input": f"${field}", "to": "objectId", "onError": None}}
+    item_pipeline = [{"$match": {"$expr": {"$eq": ["$_id", "$$item_id"]}}}]
+    if return_fields:
+        item_pipeline.append({"$project": return_fields})
+    query += [
+        {
+            "$lookup": {
+                "from": target,
+                "let": {"item_id": item_id},
+                "pipeline": item_pipeline,
+                "as": "item",
+            }
+        },
+        {"$unwind": {"path": "$item", "preserveNullAndEmptyArrays": True}},
+        {
+            "$replaceRoot": {
+                "newRoot": {"$mergeObjects": [{LIKED_ID: f"${field}"}, "$item"]}
+            }
+        },
+    ]
+    items = list(like_collection.aggregate(query))
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_page_cursor(items[-1][LIKED_ID])
+    for item in items:
+        item.pop(LIKED_ID)
+    return [item for item in items if item], next_cursor
+
+
+def delete_likes_and_counts(like_collection, user_id):
+    field = LIKE_FIELDS[like_collection.name]
+    query = {"userId": user_id, "active": 1}
+    active_ids = {like[field] for like in like_collection.find(query, {field: 1})}
+    for item_id, active in get_pending_likes(like_collection, user_id).items():
+        if active == 1:
+            active_ids.add(item_id)
+        else:
+            active_ids.discard(item_id)
+    pipeline = redis_client.pipeline()
+    pipeline.delete(
+        gen_pending_likes_key(like_collection, user_id),
+        gen_liked_ids_key(like_collection, user_id),
+        gen_liked_ids_ready_key(like_collection, user_id),
+    )
+    for item_id in active_ids:
+        pipeline.hincrby(gen_like_count_key(like_collection), item_id, -1)
+    if active_ids:
+        pipeline.sadd(gen_like_count_touched_key(like_collection), *active_ids)
+    pipeline.execute()
+    like_collection.delete_many({"userId": user_id})
+
+
+def get_all_pending_likes(like_collection):
+    """[(user id, item id, active)] of every user's toggles not flushed yet"""
+    pattern = gen_pending_likes_key(like_collection, "*")
+    user_ids = [
+        int(decode(pending_key).rsplit(":", 1)[1])
+        for pending_key in redis_client.scan_iter(match=pattern, count=1000)
+    ]
+    pipeline = redis_client.pipeline()
+    for user_id in user_ids:
+        pipeline.hgetall(gen_pending_likes_key(like_collection, user_id))
+    return [
+        (user_id, decode(item_id), int(decode(active)))
+        for user_id, pending_likes in zip(user_ids, pipeline.execute())
+        for item_id, active in pending_likes.items()
+    ]
+
+
+def get_pending_like_deltas(like_collection, pending_likes):
+    """{item id: count change} of the pending toggles over the stored likes"""
+    field = LIKE_FIELDS[like_collection.name]
+    stored_active = set()
+    for i in range(0, len(pending_likes), LIKE_FLUSH_BATCH_SIZE):
+        chunk = pending_likes[i : i + LIKE_FLUSH_BATCH_SIZE]
+        likes = [{"userId": user_id, field: item_id} for user_id, item_id, _ in chunk]
+        query = {"$or": likes, "active": 1}
+        for like in like_collection.find(query, {"userId": 1, field: 1}):
+            stored_active.add((like["userId"], like[field]))
+    deltas = {}
+    for user_id, item_id, active in pending_likes:
+        delta = active - (1 if (user_id, item_id) in stored_active else 0)
+        deltas[item_id] = deltas.get(item_id, 0) + delta
+    return deltas
+
+
+def reconcile_like_counts(like_collection):
+    """Recount every item's active likes with one $group aggregation
+
+    The flush lock is held so mongodb doesn't move during the recount, the
+    toggles it lacks are added from their pending states. Items toggled after
+    those were read keep their counters.
+    """
+    deadline = time.monotonic() + LIKE_FLUSH_LOCK_TIME
+    while not (token := acquire_lock(LIKE_FLUSH_LOCK_KEY, LIKE_FLUSH_LOCK_TIME)):
+        if time.monotonic() > deadline:
+            print(f"like count reconcile of {like_collection.name} skipped")
+            return
+        time.sleep(LIKE_FLUSH_LOCK_WAIT_INTERVAL)
+    try:
+        field = LIKE_FIELDS[like_collection.name]
+        key = gen_like_count_key(like_collection)
+        temp_key = f"{key}:reconcile"
+        touched_key = gen_like_count_touched_key(like_collection)
+        query = [
+            {"$match": {"active": 1}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        ]
+        counts = {
+            item["_id"]: item["count"]
+            for item in like_collection.aggregate(query)
+            if item["_id"] is not None
+        }
+        redis_client.delete(touched_key)
+        pending_likes = get_all_pending_likes(like_collection)
+        for item_id, delta in get_pending_like_deltas(
+            like_collection, pending_likes
+        ).items():
+            counts[item_id] = counts.get(item_id, 0) + delta
+
+        pipeline = redis_client.pipeline()
+        pipeline.delete(temp_key)
+        for item_id, count in counts.items():
+            if count > 0:
+                pipeline.hset(temp_key, item_id, count)
+        pipeline.eval(MERGE_RECOUNTED_LIKES_SCRIPT, 3, key, temp_key, touched_key)
+        pipeline.set(gen_like_count_ready_key(like_collection), 1)
+        pipeline.execute()
+    finally:
+        release_lock(LIKE_FLUSH_LOCK_KEY, token)
+
+
+def reconcile_all_like_counts():
+    # one worker per period does the work, the lock expires with the period
+    if not acquire_lock(LIKE_COUNT_RECONCILE_LOCK_KEY, LIKE_COUNT_RECONCILE_TIME):
+        return
+    for name in LIKE_FIELDS:
+        reconcile_like_counts(mongo.db[name])
+
+
+def reconcile_like_counts_loop():
+    while True:
+        try:
+            reconcile_all_like_counts()
+        except:
+            traceback.print_exc()
+        time.sleep(LIKE_COUNT_RECONCILE_TIME)
+
+
+def reconcile_like_counts_job():
+    thread = Thread(target=reconcile_like_counts_loop)
+    thread.daemon = True
+    thread.start()
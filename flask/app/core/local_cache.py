@@ -0,0 +1,49 @@
+from threading import Lock
+
+from app.core import pubsub
+
+
+class LocalCache:
+    """Per worker cache of versioned values
+
+    Writers bump a version in redis and publish "key:version" to the channel,
+    every worker then drops its entries older than the published version.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.entries = {}
+        self.latest_versions = {}
+        self.lock = Lock()
+        pubsub.subscribe(channel, self.handle_message)
+        pubsub.on_reconnect(self.clear)
+
+    def get(self, key):
+        if entry := self.entries.get(key):
+            return entry[1]
+        return None
+
+    def set(self, key, version, value):
+        with self.lock:
+            if version < self.latest_versions.get(key, 0):
+                return  # already invalidated while the value was being built
+            self.entries[key] = (version, value)
+
+    def invalidate(self, key, version):
+        with self.lock:
+            self.latest_versions[key] = max(version, self.latest_versions.get(key, 0))
+            entry = self.entries.get(key)
+            if entry and entry[0] < version:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def handle_message(self, message):
+        key, version = message.rsplit(":", 1)
+        self.invalidate(key, int(version))
+
+    def publish_invalidation(self, key, version):
+        self.invalidate(key, version)
+        pubsub.publish(self.channel, f"{key}:{version}")
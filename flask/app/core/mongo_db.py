@@ -1,9 +1,24 @@
 import os
+import base64
+from bson import ObjectId
+from bson.errors import InvalidId
 from flask_pymongo import PyMongo
 
+from app.core.variables import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    MIN_TEXT_SEARCH_TOKEN_LENGTH,
+)
+
 
 mongo = PyMongo()
 
+TEXT_SEARCH = "text"
+REGEX_SEARCH = "regex"
+SEARCH_STRATEGIES = (TEXT_SEARCH, REGEX_SEARCH)
+# field the text search sorts by, never sent with the docs
+TEXT_SCORE = "_textScore"
+
 
 def gen_query(field, search_key, exact=0, insensitive_case=True):
     # {"$text": {"$search": search_key}}
@@ -56,20 +71,138 @@ def gen_match_and_query(filters):
     return {"$match": {"$and": filters}}
 
 
-def stringify_docs(docs):
-    items = []
-    for data in docs:
-        item = {}
-        for key, value in data.items():
-            if key == "_id":
-                value = str(value)
-            if key == "created_time":
-                from app.core.resource import json_serializer
-
-                value = json_serializer(value)
-            item[key] = value
-        items.append(item)
-    return items
+def encode_page_cursor(value):
+    return base64.urlsafe_b64encode(str(value).encode("utf-8")).decode("utf-8")
+
+
+def decode_page_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        return ObjectId(value)
+    except (ValueError, TypeError, InvalidId):
+        return None
+
+
+def decode_search_cursor(cursor):
+    """(strategy, offset) of ranked search pages, which can't be keyset paginated"""
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        strategy, offset = value.split(":", 1)
+        offset = int(offset)
+        if strategy in SEARCH_STRATEGIES and offset >= 0:
+            return strategy, offset
+    except (ValueError, TypeError):
+        pass
+    return None
+
+
+def gen_after_query(cursor):
+    return {"_id": {"$gt": decode_page_cursor(cursor)}}
+
+
+def gen_page_limit(limit):
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def find_page(collection, query, return_fields=None, limit=None, after=None):
+    """Keyset page sorted by _id, one extra doc is fetched to detect a next page"""
+    if after is not None:
+        query = {**query, **gen_after_query(after)}
+    docs = collection.find(query, return_fields).sort("_id", 1)
+    if limit is not None:
+        docs = docs.limit(limit + 1)
+    return docs
+
+
+def find_stream_bound(collection, query, limit, after=None):
+    """_ids of a stream page's last doc and of the doc after it
+
+    A stream sends its headers before the docs, so the next cursor is looked
+    up first and the page is read up to it.
+    """
+    if after is not None:
+        query = {**query, **gen_after_query(after)}
+    return collection.find(query, {"_id": 1}).sort("_id", 1).skip(limit - 1).limit(2)
+
+
+def find_stream_page(
+    collection, query, return_fields=None, limit=None, after=None, bound=None
+):
+    """Return (docs, cursor of the next page or None), bound of find_stream_bound"""
+    if after is not None:
+        query = {**query, **gen_after_query(after)}
+    next_cursor = None
+    if bound is not None and len(bound) == 2:
+        last_id = bound[0]["_id"]
+        query = {"$and": [query, {"_id": {"$lte": last_id}}]}
+        next_cursor = encode_page_cursor(last_id)
+    docs = collection.find(query, return_fields).sort("_id", 1)
+    if limit is not None:
+        docs = docs.limit(limit)
+    return docs, next_cursor
+
+
+def find_offset_page(collection, query, return_fields=None, limit=None, offset=0):
+    docs = collection.find(query, return_fields).sort("_id", 1).skip(offset)
+    if limit is not None:
+        docs = docs.limit(limit + 1)
+    return docs
+
+
+def split_page(items, limit):
+    """Return (items of the page, cursor of the next page or None)"""
+    if items is None or len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_page_cursor(items[-1]["_id"])
+
+
+def split_search_page(items, limit, offset, strategy):
+    if items is None or len(items) <= limit:
+        return items, None
+    return items[:limit], encode_page_cursor(f"{strategy}:{offset + limit}")
+
+
+def gen_page_headers(next_cursor, search_strategy=None):
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if search_strategy:
+        headers["X-Search-Strategy"] = search_strategy
+    return headers or None
+
+
+def is_text_searchable(search_key):
+    """Short tokens are mostly partial words the text index can't match"""
+    tokens = search_key.split()
+    return bool(tokens) and all(
+        len(token) >= MIN_TEXT_SEARCH_TOKEN_LENGTH for token in tokens
+    )
+
+
+def find_text_search_page(
+    collection, query, search_key, return_fields=None, limit=None, offset=0
+):
+    """Docs matching the $** text index, best text score first
+
+    The docs carry the score they were sorted by, drop_text_scores removes it.
+    """
+    query = {**query, "$text": {"$search": search_key}}
+    return_fields = {**(return_fields or {}), TEXT_SCORE: {"$meta": "textScore"}}
+    sort = [(TEXT_SCORE, {"$meta": "textScore"}), ("_id", 1)]
+    docs = collection.find(query, return_fields).sort(sort).skip(offset)
+    if limit is not None:
+        docs = docs.limit(limit + 1)
+    return docs
+
+
+def drop_text_scores(docs):
+    docs = list(docs)
+    for doc in docs:
+        doc.pop(TEXT_SCORE, None)
+    return docs
 
 
 def gen_collection_active_like_query(field_key=None, field_value=None):
@@ -0,0 +1,69 @@
+import time
+import traceback
+from threading import Thread
+
+from app.core.redis import redis_client
+
+
+RECONNECT_WAIT_TIME = 1
+
+handlers = {}
+reconnect_handlers = []
+
+
+def subscribe(channel, handler):
+    """Register a handler called with the decoded message of the channel"""
+    handlers.setdefault(channel, []).append(handler)
+
+
+def on_reconnect(handler):
+    """Register a handler called whenever the listener (re)subscribes
+
+    Messages published while the listener was disconnected are lost, so local
+    state derived from them has to be dropped or reloaded here.
+    """
+    reconnect_handlers.append(handler)
+
+
+def publish(channel, message):
+    try:
+        redis_client.publish(channel, message)
+    except:
+        traceback.print_exc()
+
+
+def dispatch(channel, message):
+    for handler in handlers.get(channel, []):
+        try:
+            handler(message)
+        except:
+            traceback.print_exc()
+
+
+def listen():
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*handlers.keys())
+            for handler in reconnect_handlers:
+                handler()
+            for item in pubsub.listen():
+                if item["type"] != "message":
+                    continue
+                channel, data = item["channel"], item["data"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode("utf-8")
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                dispatch(channel, data)
+        except:
+            traceback.print_exc()
+            time.sleep(RECONNECT_WAIT_TIME)
+
+
+def start_listener_job():
+    if not handlers:
+        return
+    thread = Thread(target=listen)
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,96 @@
+import random
+import traceback
+
+from bson import ObjectId
+
+from app.core.redis import redis_client
+from app.core.variables import MAX_RANDOM_COUNT
+from app.core.mongo_db import (
+    gen_in_query,
+    gen_not_empty_array_query,
+    gen_restrict_access_query,
+)
+
+
+def gen_random_pool_key(collection):
+    return f"random_pool:{collection.name}"
+
+
+def gen_random_pool_ready_key(collection):
+    # an empty redis set doesn't exist, so readiness is kept apart
+    return f"random_pool_ready:{collection.name}"
+
+
+def gen_random_eligible_query():
+    query = gen_restrict_access_query()
+    query.update(gen_not_empty_array_query("definitions"))
+    query.update(gen_not_empty_array_query("sentences"))
+    return query
+
+
+def rebuild_random_pool(collection):
+    """Collect the ids of the public docs having definitions and sentences"""
+    key = gen_random_pool_key(collection)
+    temp_key = f"{key}:rebuild"
+    ids = [
+        str(doc["_id"])
+        for doc in collection.find(gen_random_eligible_query(), {"_id": 1})
+    ]
+    pipeline = redis_client.pipeline()
+    pipeline.delete(temp_key)
+    for i in range(0, len(ids), 1000):
+        pipeline.sadd(temp_key, *ids[i : i + 1000])
+    if ids:
+        pipeline.rename(temp_key, key)
+    else:
+        pipeline.delete(key)
+    pipeline.set(gen_random_pool_ready_key(collection), 1)
+    pipeline.execute()
+
+
+def sync_random_pool(collection, query):
+    """Add or remove the doc matching the query after it was written"""
+    try:
+        doc = collection.find_one(query, {"_id": 1})
+        if doc is None:
+            return
+        eligible_query = gen_random_eligible_query()
+        eligible_query["_id"] = doc["_id"]
+        if collection.find_one(eligible_query, {"_id": 1}):
+            redis_client.sadd(gen_random_pool_key(collection), str(doc["_id"]))
+        else:
+            redis_client.srem(gen_random_pool_key(collection), str(doc["_id"]))
+    except:
+        traceback.print_exc()
+
+
+def remove_from_random_pool(collection, ids):
+    if not ids:
+        return
+    try:
+        ids = [str(id_) for id_ in ids]
+        redis_client.srem(gen_random_pool_key(collection), *ids)
+    except:
+        traceback.print_exc()
+
+
+def gen_random_count(count):
+    # a negative SRANDMEMBER count samples with repeats
+    if not count or count < 1:
+        return 1
+    return min(count, MAX_RANDOM_COUNT)
+
+
+def get_random_docs(collection, count):
+    """Sample ids from the pool and fetch the docs by _id"""
+    count = gen_random_count(count)
+    if not redis_client.exists(gen_random_pool_ready_key(collection)):
+        rebuild_random_pool(collection)
+    ids = redis_client.srandmember(gen_random_pool_key(collection), count) or []
+    ids = [
+        ObjectId(id_.decode("utf-8") if isinstance(id_, bytes) else id_)
+        for id_ in ids
+    ]
+    docs = list(collection.find(gen_in_query(field="_id", values=ids)))
+    random.shuffle(docs)
+    return docs
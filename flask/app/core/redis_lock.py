@@ -0,0 +1,27 @@
+from app.core.redis import redis_client
+from app.core.utils import random_string_digits
+
+
+LOCK_TOKEN_LENGTH = 20
+
+# Deletes the lock only while it still holds its owner's token, once it
+# expired another process may hold it
+# KEYS: lock, ARGV: token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_lock(key, ttl):
+    """Token of the taken lock, None when another process holds it"""
+    token = random_string_digits(LOCK_TOKEN_LENGTH)
+    if redis_client.set(key, token, nx=True, ex=ttl):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    return redis_client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
@@ -4,7 +4,7 @@ from flask_restplus import Resource
 
 from flask import current_app, request
 from app.core.response import CustomeResponse
-from app.core.redis import redis_client
+from app.core.auth import get_request_auth_user
 
 class CustomResource(Resource):
     def __init__(self, api=None, *args, **kwargs):
@@ -28,15 +28,11 @@ class CustomResource(Resource):
 
 def token_checker(f):
     def wrapper(*args, **kwargs):
-        user = None
         from app.core.models import User as UserModel
 
         if current_app.config["TESTING"]:
             return f(*args, **kwargs, auth_user=UserModel.query.get(1))
-        if auth_header := request.headers.get("Authorization"):
-            if user_id := redis_client.get(auth_header):
-                user = UserModel.query.get(user_id)
-        return f(*args, **kwargs, auth_user=user)
+        return f(*args, **kwargs, auth_user=get_request_auth_user(request))
 
     wrapper.__doc__ = f.__doc__
     wrapper.__name__ = f.__name__
@@ -1,22 +1,20 @@
 import traceback
-import json
 
 from flask import Response, current_app, request
 
 from app.core.constants import response
-from app.core.redis import redis_client
+from app.core.auth import get_request_auth_user
+from app.core.content_version import get_content_version, gen_etag
+from app.core.serializer import encode, encode_response_body
 
 
 def return_401_for_no_auth(f):
     def wrapper(*args, **kwargs):
-        user = None
         from app.core.models import User as UserModel
 
         if current_app.config["TESTING"]:
             return f(*args, **kwargs, auth_user=UserModel.query.get(1))
-        if auth_header := request.headers.get("Authorization"):
-            if user_id := redis_client.get(auth_header):
-                user = UserModel.query.get(user_id)
+        user = get_request_auth_user(request)
         if user is not None:
             return f(*args, **kwargs, auth_user=user)
         else:
@@ -44,11 +42,58 @@ def return_500_for_sever_error(f):
     return wrapper
 
 
+def is_stream_requested():
+    """Clients opt in to NDJSON streaming with 'Accept: application/x-ndjson'"""
+    best = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson"]
+    )
+    return best == "application/x-ndjson"
+
+
+def return_304_for_not_modified(collection):
+    """Answer If-None-Match requests from the collection's content version
+
+    Must be placed under token_checker as admins get different payloads. The
+    response goes without an etag when the version can't be read.
+    """
+
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            try:
+                version = get_content_version(collection)
+            except:
+                traceback.print_exc()
+                return f(*args, **kwargs)
+            auth_user = kwargs.get("auth_user")
+            is_admin = 1 if auth_user and auth_user.is_admin() else 0
+            is_stream = 1 if is_stream_requested() else 0
+            etag = gen_etag(
+                collection,
+                version,
+                f"{request.full_path}|{is_admin}|{is_stream}",
+            )
+            if request.if_none_match.contains(etag):
+                response = CustomeResponse()
+                return response.send_not_modified(etag)
+
+            result = f(*args, **kwargs)
+            if result.status_code == 200:
+                result.set_etag(etag)
+            return result
+
+        wrapper.__doc__ = f.__doc__
+        wrapper.__name__ = f.__name__
+        return wrapper
+
+    return decorator
+
+
 class CustomeResponse:
     headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Headers": "*",
         "Access-Control-Allow-Credentials": "True",
+        "Access-Control-Expose-Headers": "ETag, X-Next-Cursor, X-Search-Strategy",
     }
 
     def send(
@@ -57,23 +102,54 @@ class CustomeResponse:
         response_type=None,
         lang="en",
         additional_message=None,
+        headers=None,
     ):
 
-        status = response.status[response_type]
-        message = response.message[lang][response_type]
+        return Response(
+            encode_response_body(result, response_type, lang, additional_message),
+            status=response.status[response_type],
+            headers={**self.headers, **headers} if headers else self.headers,
+            mimetype="application/json",
+        )
+
+    def send_encoded(self, body, response_type=None):
+        """Send a body already built by wrap_response_body"""
+        return Response(
+            body,
+            status=response.status[response_type],
+            headers=self.headers,
+            mimetype="application/json",
+        )
 
-        if additional_message is not None:
-            message += f"({additional_message})"
+    def send_stream(self, docs, response_type="SUCCESS", headers=None):
+        """Encode and flush docs one by one as NDJSON while the cursor is read
 
-        response_body = {"result": result, "message": message}
+        The status is sent before the docs, a failure on the way ends the
+        stream with the SEVER_ERROR envelope as its last line.
+        """
+
+        def generate():
+            try:
+                for doc in docs:
+                    yield encode(doc) + b"\n"
+            except:
+                traceback.print_exc()
+                yield encode_response_body(None, "SEVER_ERROR") + b"\n"
 
-        json_encode = json.JSONEncoder().encode
         return Response(
-            json_encode(response_body),
-            status=status,
+            generate(),
+            status=response.status[response_type],
+            headers={**self.headers, **headers} if headers else self.headers,
+            mimetype="application/x-ndjson",
+        )
+
+    def send_not_modified(self, etag):
+        result = Response(
+            status=response.status["NOT_MODIFIED"],
             headers=self.headers,
-            mimetype="application/json",
         )
+        result.set_etag(etag)
+        return result
 
 
 def gen_dupilcate_keys_message(keys, lang="en"):
@@ -0,0 +1,55 @@
+import json
+from datetime import date, datetime
+from functools import lru_cache
+
+from bson import ObjectId
+
+from app.core.constants import response
+
+
+def json_default(obj):
+    """Encode the bson types found in pymongo documents"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+# One shared encoder, same separators as json.JSONEncoder() used to produce
+json_encode = json.JSONEncoder(default=json_default).encode
+
+
+def encode(obj):
+    """pymongo documents(or lists of them) to UTF-8 JSON bytes in one pass"""
+    return json_encode(obj).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def get_envelope(response_type, lang="en", additional_message=None):
+    message = response.message[lang][response_type]
+    if additional_message is not None:
+        message += f"({additional_message})"
+    prefix = b'{"result": '
+    suffix = b', "message": ' + encode(message) + b"}"
+    return prefix, suffix
+
+
+def wrap_response_body(
+    encoded_result, response_type, lang="en", additional_message=None
+):
+    """Put an already encoded result into the response envelope"""
+    if isinstance(encoded_result, str):
+        encoded_result = encoded_result.encode("utf-8")
+    if additional_message is None:
+        envelope = get_envelope(response_type, lang)
+    else:  # not cached, the messages can carry user input
+        envelope = get_envelope.__wrapped__(response_type, lang, additional_message)
+    prefix, suffix = envelope
+    return prefix + encoded_result + suffix
+
+
+def encode_response_body(
+    result, response_type, lang="en", additional_message=None
+):
+    return wrap_response_body(encode(result), response_type, lang, additional_message)
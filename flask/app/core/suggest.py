@@ -0,0 +1,97 @@
+from bisect import bisect_left
+from threading import Lock
+
+from app.core.catalog_terms import (
+    PHRASAL_VERB,
+    load_public_terms,
+    subscribe_term_changes,
+)
+
+
+VERB = "verb"
+
+
+class SuggestIndex:
+    """Case folded sorted array of public terms, prefixes are found with bisect
+
+    Loaded on first use in each worker and kept current by catalog term events.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.verb_counts = {}
+        self.loaded = False
+        self.lock = Lock()
+
+    def reset(self):
+        self.loaded = False
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            self.entries, self.verb_counts = [], {}
+            for kind, term in load_public_terms():
+                self._add(kind, term)
+            self.loaded = True
+
+    def add(self, kind, term):
+        with self.lock:
+            self._add(kind, term)
+
+    def remove(self, kind, term):
+        with self.lock:
+            self._remove(kind, term)
+
+    def _add(self, kind, term):
+        if not self._insert((term.casefold(), term, kind)):
+            return
+        # a verb is suggested as long as one of its phrasal verbs is public
+        if kind == PHRASAL_VERB:
+            verb = term.split(" ", 1)[0]
+            self.verb_counts[verb] = self.verb_counts.get(verb, 0) + 1
+            if self.verb_counts[verb] == 1:
+                self._insert((verb.casefold(), verb, VERB))
+
+    def _remove(self, kind, term):
+        if not self._delete((term.casefold(), term, kind)):
+            return
+        if kind == PHRASAL_VERB:
+            verb = term.split(" ", 1)[0]
+            self.verb_counts[verb] = self.verb_counts.get(verb, 1) - 1
+            if self.verb_counts[verb] <= 0:
+                del self.verb_counts[verb]
+                self._delete((verb.casefold(), verb, VERB))
+
+    def _insert(self, entry):
+        index = bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            return False
+        self.entries.insert(index, entry)
+        return True
+
+    def _delete(self, entry):
+        index = bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+            return True
+        return False
+
+    def suggest(self, prefix, limit):
+        if not self.loaded:
+            self.load()
+        prefix = prefix.strip().casefold()
+        entries = self.entries
+        result = []
+        index = bisect_left(entries, (prefix,))
+        while index < len(entries) and len(result) < limit:
+            folded, term, kind = entries[index]
+            if not folded.startswith(prefix):
+                break
+            result.append({"term": term, "type": kind})
+            index += 1
+        return result
+
+
+suggest_index = SuggestIndex()
+subscribe_term_changes(suggest_index)
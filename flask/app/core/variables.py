@@ -2,4 +2,35 @@ DAY_TIME = 60 * 60 * 24
 HOUR_TIME = 60 * 60
 
 TOKEN_VALID_TIME = 8 * HOUR_TIME
+SESSION_SLIDING_EXPIRY = True
+AUTH_CACHE_SIZE = 10000
+AUTH_CACHE_TIME = 60
 UPDATE_VERB_LIST_TIME = DAY_TIME
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+MAX_RANDOM_COUNT = 100
+MIN_TEXT_SEARCH_TOKEN_LENGTH = 3
+LIKE_COUNT_RECONCILE_TIME = HOUR_TIME
+MAX_BATCH_LIKE_COUNT = 100
+LIKE_FLUSH_INTERVAL = 2
+LIKE_FLUSH_BATCH_SIZE = 500
+LIKE_FLUSH_LOCK_TIME = 60
+LIKED_IDS_CACHE_TIME = DAY_TIME
+ORPHANED_LIKES_CHECK_TIME = DAY_TIME
+ORPHANED_LIKES_CHUNK_SIZE = 1000
+BOOTSTRAP_LOCK_TIME = 5 * 60
+BOOTSTRAP_READY_TIME = DAY_TIME
+BOOTSTRAP_WAIT_TIME = 20  # under gunicorn's worker timeout
+CRAWLER_WORKER_COUNT = 2
+CRAWLER_MAX_RUNNING = 4
+CRAWLER_MAX_ATTEMPTS = 5
+CRAWLER_RETRY_BASE_TIME = 30
+CRAWLER_RETRY_MAX_TIME = HOUR_TIME
+CRAWLER_COMMAND_TIMEOUT = 10 * 60
+CRAWLER_JOB_LEASE_TIME = CRAWLER_COMMAND_TIMEOUT + 60  # past the deadline of the command
+CRAWLER_JOB_KEEP_TIME = 7 * DAY_TIME
+CRAWLER_POLL_INTERVAL = 1
+CRAWLER_RECENT_JOB_COUNT = 100
+BULK_IMPORT_MAX_COUNT = 10000
+BULK_WRITE_CHUNK_SIZE = 1000
@@ -0,0 +1,194 @@
+import json
+from collections import deque
+from threading import Lock
+
+from app.core import pubsub
+from app.core.redis import redis_client
+from app.core.mongo_db import mongo
+
+
+VERB_PARTICLES_CHANNEL = "verb_particles"
+VERB_PARTICLES_KEY = "verb_particles"
+VERB_PARTICLES_VERSION_KEY = "verb_particles_version"
+VERB_PARTICLES_READY_KEY = "verb_particles_ready"
+FIELD_SEPARATOR = "\t"
+UNAPPLIED_CHANGES_SIZE = 100
+
+# Sets or deletes one "verb\tparticle" -> is_public field and bumps the version
+# KEYS: pairs, version, ARGV: field, is_public or "" to delete
+UPDATE_PAIR_SCRIPT = """
+if ARGV[2] == "" then
+    redis.call("HDEL", KEYS[1], ARGV[1])
+else
+    redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+end
+return redis.call("INCR", KEYS[2])
+"""
+
+
+def gen_pair_field(verb, particle):
+    return f"{verb}{FIELD_SEPARATOR}{particle}"
+
+
+def load_pair_states():
+    """{(verb, particle): 1 when any of its phrasal verbs is public}"""
+    query = [
+        {"$match": {"verb": {"$ne": None}, "particle": {"$ne": None}}},
+        {
+            "$group": {
+                "_id": {"verb": "$verb", "particle": "$particle"},
+                "is_public": {
+                    "$max": {"$cond": [{"$eq": ["$is_public", 1]}, 1, 0]}
+                },
+            }
+        },
+    ]
+    return {
+        (item["_id"]["verb"], item["_id"]["particle"]): item["is_public"]
+        for item in mongo.db.phrasal_verbs.aggregate(query)
+    }
+
+
+def rebuild_verb_particles():
+    """Materialize every verb-particle pair of mongodb into redis"""
+    temp_key = f"{VERB_PARTICLES_KEY}:rebuild"
+    pairs = load_pair_states()
+    pipeline = redis_client.pipeline()
+    pipeline.delete(temp_key)
+    for (verb, particle), is_public in pairs.items():
+        pipeline.hset(temp_key, gen_pair_field(verb, particle), is_public)
+    if pairs:
+        pipeline.rename(temp_key, VERB_PARTICLES_KEY)
+    else:
+        pipeline.delete(VERB_PARTICLES_KEY)
+    pipeline.incr(VERB_PARTICLES_VERSION_KEY)
+    pipeline.set(VERB_PARTICLES_READY_KEY, 1)
+    version = pipeline.execute()[-2]
+    publish_verb_particles_change({"version": version, "reset": True})
+
+
+def sync_verb_particle(verb, particle):
+    """Update the pair after its phrasal verbs were written or deleted"""
+    if verb is None or particle is None:
+        return
+    query = {"verb": verb, "particle": particle}
+    docs = list(mongo.db.phrasal_verbs.find(query, {"is_public": 1}))
+    is_public = None
+    if docs:
+        is_public = 1 if any(doc.get("is_public") == 1 for doc in docs) else 0
+    version = redis_client.eval(
+        UPDATE_PAIR_SCRIPT,
+        2,
+        VERB_PARTICLES_KEY,
+        VERB_PARTICLES_VERSION_KEY,
+        gen_pair_field(verb, particle),
+        "" if is_public is None else is_public,
+    )
+    change = {"verb": verb, "particle": particle, "is_public": is_public}
+    publish_verb_particles_change({"version": version, **change})
+
+
+def publish_verb_particles_change(change):
+    message = json.dumps(change)
+    pubsub.dispatch(VERB_PARTICLES_CHANNEL, message)  # this worker right away
+    pubsub.publish(VERB_PARTICLES_CHANNEL, message)
+
+
+class VerbParticleIndex:
+    """Per worker copy of the verb -> {particle: is_public} adjacency
+
+    Loaded from redis on first use, then kept current by the versioned change
+    messages. A missed message(version gap) makes the next read reload.
+    """
+
+    def __init__(self, channel):
+        self.pairs = {}
+        self.version = None
+        # received while not loaded, only the ones racing a load matter
+        self.unapplied_changes = deque(maxlen=UNAPPLIED_CHANGES_SIZE)
+        self.lock = Lock()
+        pubsub.subscribe(channel, self.handle_message)
+        pubsub.on_reconnect(self.reset)
+
+    def reset(self):
+        with self.lock:
+            self.version = None
+            self.unapplied_changes.clear()
+
+    def load(self):
+        if not redis_client.exists(VERB_PARTICLES_READY_KEY):
+            rebuild_verb_particles()
+        pipeline = redis_client.pipeline(transaction=True)
+        pipeline.get(VERB_PARTICLES_VERSION_KEY)
+        pipeline.hgetall(VERB_PARTICLES_KEY)
+        version, fields = pipeline.execute()
+        pairs = {}
+        for field, is_public in fields.items():
+            verb, particle = field.decode("utf-8").split(FIELD_SEPARATOR, 1)
+            pairs.setdefault(verb, {})[particle] = int(is_public)
+        with self.lock:
+            self.pairs = pairs
+            self.version = int(version or 0)
+            changes = sorted(self.unapplied_changes, key=lambda c: c["version"])
+            self.unapplied_changes.clear()
+            for change in changes:
+                if self.version is not None:
+                    self.apply(change)
+
+    def ensure_loaded(self):
+        if self.version is None:
+            self.load()
+
+    def handle_message(self, message):
+        change = json.loads(message)
+        with self.lock:
+            if self.version is None:
+                if not change.get("reset"):
+                    self.unapplied_changes.append(change)
+                return
+            self.apply(change)
+
+    def apply(self, change):
+        if change["version"] <= self.version:
+            return
+        if change.get("reset") or change["version"] != self.version + 1:
+            self.version = None
+            self.unapplied_changes.clear()
+            return
+        particles = self.pairs.setdefault(change["verb"], {})
+        if change["is_public"] is None:
+            particles.pop(change["particle"], None)
+            if not particles:
+                del self.pairs[change["verb"]]
+        else:
+            particles[change["particle"]] = change["is_public"]
+        self.version = change["version"]
+
+    def get_verbs(self, only_public=True):
+        self.ensure_loaded()
+        with self.lock:
+            return sorted(
+                verb
+                for verb, particles in self.pairs.items()
+                if not only_public or any(particles.values())
+            )
+
+    def get_particles(self, verb=None, only_public=True):
+        """Particles of the verb, or of every verb when verb is None"""
+        self.ensure_loaded()
+        with self.lock:
+            if verb is None:
+                particles = self.pairs.values()
+            else:
+                particles = [self.pairs.get(verb, {})]
+            return sorted(
+                {
+                    particle
+                    for items in particles
+                    for particle, is_public in items.items()
+                    if not only_public or is_public
+                }
+            )
+
+
+verb_particle_index = VerbParticleIndex(VERB_PARTICLES_CHANNEL)
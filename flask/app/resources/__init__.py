@@ -9,6 +9,8 @@ from .users import api as users
 from .verbs import api as verbs
 from .particles import api as particles
 from .dictionaries import api as dictionaries
+from .suggest import api as suggest
+from .stats import api as stats
 
 blueprint = Blueprint("api_v1", __name__)
 api = Api(blueprint, title="Learn English API", version="1.0", description="")
@@ -21,3 +23,5 @@ api.add_namespace(users)
 api.add_namespace(verbs)
 api.add_namespace(particles)
 api.add_namespace(dictionaries)
+api.add_namespace(suggest)
+api.add_namespace(stats)
@@ -4,7 +4,6 @@ from app.core.mongo_db import (
     mongo,
     gen_not_include_query,
     gen_return_fields_query,
-    stringify_docs,
 )
 from app.core.response import (
     return_500_for_sever_error,
@@ -19,7 +18,7 @@ def get_phrasal_verbs_to_search():
     return_fields = gen_return_fields_query(
         includes=["phrasal_verb", "_id"],
     )
-    return stringify_docs(mongo.db.phrasal_verbs.find(query, return_fields))
+    return list(mongo.db.phrasal_verbs.find(query, return_fields))
 
 
 def get_idioms_to_search():
@@ -27,7 +26,7 @@ def get_idioms_to_search():
     return_fields = gen_return_fields_query(
         includes=["expression", "_id"],
     )
-    return stringify_docs(mongo.db.idioms.find(query, return_fields))
+    return list(mongo.db.idioms.find(query, return_fields))
 
 
 @api.route("/phrasal-verb")
@@ -1,27 +1,63 @@
 # -*- coding: utf-8 -*-
 import traceback
 from bson import ObjectId
+from flask import request
 from flask_restplus import Namespace, reqparse, Resource
+from werkzeug.datastructures import FileStorage
 
 from app.core.response import (
     return_500_for_sever_error,
     return_401_for_no_auth,
+    return_304_for_not_modified,
+    is_stream_requested,
     CustomeResponse,
 )
 
 from app.core.mongo_db import (
     mongo,
-    gen_match_and_query,
-    gen_random_docs_query,
-    gen_not_empty_array_query,
     gen_restrict_access_query,
     gen_query,
-    stringify_docs,
-    gen_collection_active_like_query,
-    gen_user_active_like_query,
     gen_return_fields_query,
+    find_page,
+    find_stream_bound,
+    find_stream_page,
+    split_page,
+    gen_page_limit,
+    gen_page_headers,
+    decode_page_cursor,
+    decode_search_cursor,
+    split_search_page,
+    is_text_searchable,
+    find_text_search_page,
+    drop_text_scores,
+    find_offset_page,
+    TEXT_SEARCH,
+    REGEX_SEARCH,
 )
 from app.core.resource import token_checker
+from app.core.content_version import bump_content_version
+from app.core.catalog_terms import publish_term_change, IDIOM
+from app.core.fuzzy import fuzzy_index
+from app.core.bulk_import import (
+    BulkImportError,
+    read_bulk_entries,
+    import_bulk_entries,
+    summarize_bulk_results,
+    refresh_after_bulk_import,
+)
+from app.core.like_counter import (
+    get_like_count,
+    get_likes,
+    get_user_like_active,
+    update_user_like,
+)
+from app.core.variables import MAX_BATCH_LIKE_COUNT
+from app.core.random_pool import (
+    get_random_docs,
+    sync_random_pool,
+    rebuild_random_pool,
+    remove_from_random_pool,
+)
 
 api = Namespace("idioms", description="Idioms related operations")
 
@@ -36,53 +72,80 @@ def get_only_public_idioms():
 
 def get_random_public_idioms(count):
     try:
-        match_and_filters = [
-            gen_not_empty_array_query("definitions"),
-            gen_not_empty_array_query("sentences"),
-            gen_restrict_access_query(),
-        ]
-        query = [
-            gen_match_and_query(match_and_filters),
-            gen_random_docs_query(count),
-        ]
-        return stringify_docs(mongo.db.idioms.aggregate(query))
+        return get_random_docs(mongo.db.idioms, count)
     except:
         traceback.print_exc()
         return None
 
 
-def get_random_public_idioms(count):
-    try:
-        match_and_filters = [
-            gen_not_empty_array_query("definitions"),
-            gen_not_empty_array_query("sentences"),
-            gen_restrict_access_query(),
-        ]
-        query = [
-            gen_match_and_query(match_and_filters),
-            gen_random_docs_query(count),
+def gen_idiom_list_query(only_public):
+    query = {}
+    if not only_public:
+        query = gen_restrict_access_query()
+    return query
+
+
+def gen_full_search_query(search_key, exact):
+    return {
+        "$or": [
+            gen_query("expression", search_key, exact),
+            gen_query("definitions", search_key, exact),
+            gen_query("sentences", search_key, exact),
         ]
-        return stringify_docs(mongo.db.idioms.aggregate(query))
+    }
+
+
+def gen_idiom_find_query(search_key=None, full_search=0, exact=0, only_public=False):
+    query = gen_idiom_list_query(only_public)
+    if search_key is not None:
+        if full_search:
+            query.update(gen_full_search_query(search_key, exact))
+        else:
+            query.update(gen_query("expression", search_key, exact))
+    return query
+
+
+def find_idioms(limit=None, after=None, **kwargs):
+    query = gen_idiom_find_query(**kwargs)
+    return find_page(mongo.db.idioms, query, None, limit, after)
+
+
+def stream_idioms(limit=None, after=None, **kwargs):
+    """Return (docs, next page cursor or None) of a stream of at most limit docs"""
+    query = gen_idiom_find_query(**kwargs)
+    bound = None
+    if limit is not None:
+        bound = list(find_stream_bound(mongo.db.idioms, query, limit, after))
+    return find_stream_page(mongo.db.idioms, query, None, limit, after, bound)
+
+
+def search_idioms(search_key, only_public=False, limit=None, cursor=None):
+    """Ranked search, returns (docs, strategy served the query)
+
+    Same fallback as search_phrasal_verbs.
+    """
+    try:
+        strategy, offset = cursor or (None, 0)
+        query = gen_idiom_list_query(only_public)
+        if strategy != REGEX_SEARCH and is_text_searchable(search_key):
+            docs = drop_text_scores(
+                find_text_search_page(
+                    mongo.db.idioms, query, search_key, None, limit, offset
+                )
+            )
+            if docs or strategy == TEXT_SEARCH:
+                return docs, TEXT_SEARCH
+        query.update(gen_full_search_query(search_key, exact=0))
+        docs = find_offset_page(mongo.db.idioms, query, None, limit, offset)
+        return list(docs), REGEX_SEARCH
     except:
         traceback.print_exc()
-        return None
+        return None, None
 
 
-def get_idioms(search_key=None, full_search=0, exact=0, only_public=False):
+def get_idioms(**kwargs):
     try:
-        query = {}
-        if not only_public:
-            query = gen_restrict_access_query()
-        if search_key is not None:
-            if full_search:
-                query["$or"] = [
-                    gen_query("expression", search_key, exact),
-                    gen_query("definitions", search_key, exact),
-                    gen_query("sentences", search_key, exact),
-                ]
-            else:
-                query.update(gen_query("expression", search_key, exact))
-        return stringify_docs(mongo.db.idioms.find(query))
+        return list(find_idioms(**kwargs))
     except:
         traceback.print_exc()
         return None
@@ -98,6 +161,10 @@ def add_idiom(args):
             "is_public": args.get("is_public") or 0,
         }
         mongo.db.idioms.insert_one(idiom_data)
+        sync_random_pool(mongo.db.idioms, {"_id": idiom_data["_id"]})
+        if idiom_data["is_public"] == 1:
+            publish_term_change("add", IDIOM, [idiom_data["expression"]])
+        bump_content_version("idioms")
         return True
     except:
         traceback.print_exc()
@@ -113,7 +180,12 @@ def delete_idiom(args):
         if args["expression"] is not None:
             query["expression"] = args["expression"]
 
+        deleted_docs = list(mongo.db.idioms.find(query, {"expression": 1}))
         mongo.db.idioms.delete_many(query)
+        remove_from_random_pool(mongo.db.idioms, [doc["_id"] for doc in deleted_docs])
+        deleted_expressions = [doc.get("expression") for doc in deleted_docs]
+        publish_term_change("remove", IDIOM, deleted_expressions)
+        bump_content_version("idioms")
         return True
     except:
         traceback.print_exc()
@@ -121,31 +193,18 @@ def delete_idiom(args):
 
 
 def get_idioms_like_count(idiom_id):
-    query = gen_collection_active_like_query(field_key="idiomId", field_value=idiom_id)
-    return mongo.db.user_like_idiom.find(query).count()
+    return get_like_count(mongo.db.user_like_idiom, idiom_id)
 
 
 def get_user_like_active_status(user_info, target):
     if user_info:
-        query = gen_user_active_like_query(
-            user_info.id,
-            field_key="idiomId",
-            field_value=target,
-        )
-        if mongo.db.user_like_idiom.find_one(query):
-            return 1
+        return get_user_like_active(mongo.db.user_like_idiom, user_info.id, target)
     return 0
 
 
 def update_user_like_idiom(user_id, args):
     try:
-        search_query = {
-            "userId": user_id,
-            "idiomId": args.idiom_id,
-        }
-        user_like = search_query.copy()
-        user_like["active"] = args.like
-        mongo.db.user_like_idiom.replace_one(search_query, user_like, upsert=True)
+        update_user_like(mongo.db.user_like_idiom, user_id, args.idiom_id, args.like)
         return True
     except:
         traceback.print_exc()
@@ -172,6 +231,16 @@ parser_search_idiom.add_argument(
 parser_search_idiom.add_argument(
     "exact", type=int, help="Search exact search key when 1", location="args"
 )
+parser_search_idiom.add_argument(
+    "text_search",
+    type=int,
+    help="Ranked search in text indexes when 1",
+    location="args",
+)
+parser_search_idiom.add_argument("limit", type=int, help="Page size", location="args")
+parser_search_idiom.add_argument(
+    "after", type=str, help="X-Next-Cursor of the previous page", location="args"
+)
 
 parser_delete = reqparse.RequestParser()
 parser_delete.add_argument("_id", type=str, help="_id", location="args")
@@ -191,6 +260,19 @@ parser_like_create = reqparse.RequestParser()
 parser_like_create.add_argument("idiom_id", type=str, required=True, help="Idiom id")
 parser_like_create.add_argument("like", type=int, required=True, help="like when 1")
 
+parser_get_idiom_likes_batch = reqparse.RequestParser()
+parser_get_idiom_likes_batch.add_argument(
+    "idiom_ids",
+    type=str,
+    required=True,
+    action="split",
+    help="Comma separated _ids",
+    location="args",
+)
+parser_get_idiom_likes_batch.add_argument(
+    "Authorization", type=str, location="headers"
+)
+
 parser_dictionary = reqparse.RequestParser()
 parser_dictionary.add_argument("datetime", type=str, required=True)
 parser_dictionary.add_argument(
@@ -202,6 +284,15 @@ parser_dictionary.add_argument(
 parser_dictionary.add_argument("examples", type=str, help="Examples", action="append")
 
 
+def sync_idiom_terms(expression):
+    return_fields = gen_return_fields_query(includes=["is_public"])
+    doc = mongo.db.idioms.find_one({"expression": expression}, return_fields)
+    if doc is None:
+        return
+    action = "add" if doc.get("is_public") == 1 else "remove"
+    publish_term_change(action, IDIOM, [expression])
+
+
 def upsert_idiom(idiom_info):
     try:
         upsert_idiom = {"$set": idiom_info}
@@ -209,6 +300,9 @@ def upsert_idiom(idiom_info):
             {"expression": idiom_info["expression"]}, upsert_idiom, upsert=True
         )
         print(rs)
+        sync_idiom_terms(idiom_info["expression"])
+        sync_random_pool(mongo.db.idioms, {"expression": idiom_info["expression"]})
+        bump_content_version("idioms")
         return True
 
     except:
@@ -216,24 +310,101 @@ def upsert_idiom(idiom_info):
         return False
 
 
+# (name, type, required) of the create parser's fields
+IDIOM_FIELDS = [
+    ("expression", str, True),
+    ("definitions", list, False),
+    ("sentences", list, False),
+    ("difficulty", int, False),
+    ("is_public", int, False),
+]
+
+
+def import_idioms(entries):
+    """Upsert the entries as POST does each, then refresh the caches once"""
+    results, written = import_bulk_entries(
+        mongo.db.idioms,
+        entries,
+        IDIOM_FIELDS,
+        gen_key=lambda entry: entry["expression"],
+        gen_search_query=lambda entry: {"expression": entry["expression"]},
+    )
+    if written:
+        public = [key for key, entry in written.items() if entry["is_public"] == 1]
+        private = [key for key, entry in written.items() if entry["is_public"] != 1]
+        refresh_after_bulk_import(
+            [
+                ("random_pool", lambda: rebuild_random_pool(mongo.db.idioms)),
+                ("add_terms", lambda: publish_term_change("add", IDIOM, public)),
+                ("remove_terms", lambda: publish_term_change("remove", IDIOM, private)),
+                ("content_version", lambda: bump_content_version("idioms")),
+            ]
+        )
+    return summarize_bulk_results(results)
+
+
+parser_bulk = reqparse.RequestParser()
+parser_bulk.add_argument(
+    "file",
+    type=FileStorage,
+    location="files",
+    help="JSON array or NDJSON of idioms, or send it as the body",
+)
+
+
 @api.route("/")
 class Idioms(Resource, CustomeResponse):
     @api.doc("list_idioms")
     @api.expect(parser_search_idiom, parser_header)
     @token_checker
+    @return_304_for_not_modified("idioms")
     @return_500_for_sever_error
     def get(self, **kwargs):
         only_public = (
             False if kwargs["auth_user"] and kwargs["auth_user"].is_admin() else True
         )
         args = parser_search_idiom.parse_args()
-        result = get_idioms(
-            search_key=args["search_key"],
-            full_search=args["full_search"],
-            exact=args["exact"],
-            only_public=only_public,
+        if args["text_search"] and args["search_key"]:
+            return self.send_search_page(args["search_key"], only_public, args)
+        if args["after"] and decode_page_cursor(args["after"]) is None:
+            return self.send(response_type="FAIL", additional_message="Invalid cursor")
+        search_args = {
+            "search_key": args["search_key"],
+            "full_search": args["full_search"],
+            "exact": args["exact"],
+            "only_public": only_public,
+            "after": args["after"],
+        }
+        if is_stream_requested():
+            if args["limit"] is not None and args["limit"] < 1:
+                return self.send(
+                    response_type="FAIL", additional_message="limit must be positive"
+                )
+            docs, next_cursor = stream_idioms(limit=args["limit"], **search_args)
+            return self.send_stream(docs, headers=gen_page_headers(next_cursor))
+
+        limit = gen_page_limit(args["limit"])
+        result = get_idioms(limit=limit, **search_args)
+        result, next_cursor = split_page(result, limit)
+        return self.send(
+            response_type="SUCCESS",
+            result=result,
+            headers=gen_page_headers(next_cursor),
+        )
+
+    def send_search_page(self, search_key, only_public, args):
+        cursor = None
+        if args["after"] and (cursor := decode_search_cursor(args["after"])) is None:
+            return self.send(response_type="FAIL", additional_message="Invalid cursor")
+        limit = gen_page_limit(args["limit"])
+        result, strategy = search_idioms(search_key, only_public, limit, cursor)
+        offset = cursor[1] if cursor else 0
+        result, next_cursor = split_search_page(result, limit, offset, strategy)
+        return self.send(
+            response_type="SUCCESS",
+            result=result,
+            headers=gen_page_headers(next_cursor, search_strategy=strategy),
         )
-        return self.send(response_type="SUCCESS", result=result)
 
     @api.doc("add an idiom")
     @api.expect(parser_create, parser_header)
@@ -263,8 +434,25 @@ class Idioms(Resource, CustomeResponse):
         return self.send(response_type=status)
 
 
+@api.route("/bulk")
+class IdiomsBulk(Resource, CustomeResponse):
+    @api.doc("add or update many idioms")
+    @api.expect(parser_bulk, parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def post(self, **kwargs):
+        """Add or update idioms in one write, with the result of each entry"""
+        if not kwargs["auth_user"].is_admin():
+            return self.send(response_type="FORBIDDEN")
+        try:
+            entries = read_bulk_entries(request)
+        except BulkImportError as e:
+            return self.send(response_type="FAIL", additional_message=str(e))
+        return self.send(response_type="SUCCESS", result=import_idioms(entries))
+
+
 def get_idiom_with_dictionary(idiom):
-    return stringify_docs(mongo.db.idioms.find({"expression": idiom}))
+    return list(mongo.db.idioms.find({"expression": idiom}))
 
 
 def get_idiom(idiom):
@@ -272,7 +460,7 @@ def get_idiom(idiom):
         query = gen_restrict_access_query()
         query.update({"expression": idiom})
         return_fields = gen_return_fields_query(excludes=["dictionaries", "is_public"])
-        return stringify_docs(mongo.db.idioms.find(query, return_fields))
+        return list(mongo.db.idioms.find(query, return_fields))
     except:
         traceback.print_exc()
         return None
@@ -282,6 +470,7 @@ def upsert_idiom_dictionary(idiom, data):
     try:
         upsert_dictionary = {"$set": {"dictionaries": data}}
         mongo.db.idioms.update({"expression": idiom}, upsert_dictionary, upsert=True)
+        bump_content_version("idioms")
         return True
 
     except:
@@ -309,6 +498,7 @@ class PhrasalVerbs(Resource, CustomeResponse):
 class Idiom(Resource, CustomeResponse):
     @api.expect(parser_header)
     @token_checker
+    @return_304_for_not_modified("idioms")
     @return_500_for_sever_error
     def get(self, idiom, **kwargs):
         """Get a idiom verb"""
@@ -319,7 +509,10 @@ class Idiom(Resource, CustomeResponse):
         if result:
             return self.send(response_type="SUCCESS", result=result)
         else:
-            return self.send(response_type="NOT_FOUND")
+            did_you_mean = fuzzy_index.search(IDIOM, idiom)
+            return self.send(
+                response_type="NOT_FOUND", result={"did_you_mean": did_you_mean}
+            )
 
     @api.expect(parser_header, parser_dictionary)
     @return_401_for_no_auth
@@ -367,3 +560,23 @@ class IdiomLikes(Resource, CustomeResponse):
             return self.send(response_type="SUCCESS")
         else:
             return self.send(response_type="FAIL")
+
+
+@api.route("/likes/batch")
+class IdiomLikesBatch(Resource, CustomeResponse):
+    @api.doc("idiom likes of many items")
+    @api.expect(parser_get_idiom_likes_batch)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Like counts and the user's like states keyed by idiom id"""
+        args = parser_get_idiom_likes_batch.parse_args()
+        item_ids = list(dict.fromkeys(id_ for id_ in args["idiom_ids"] if id_))
+        if not item_ids or len(item_ids) > MAX_BATCH_LIKE_COUNT:
+            return self.send(
+                response_type="FAIL",
+                additional_message=f"1 to {MAX_BATCH_LIKE_COUNT} ids",
+            )
+        user_id = kwargs["auth_user"].id
+        result = get_likes(mongo.db.user_like_idiom, user_id, item_ids)
+        return self.send(response_type="SUCCESS", result=result)
@@ -1,50 +1,83 @@
 # -*- coding: utf-8 -*-
-import json
 import os
 import traceback
 from bson import ObjectId
-from threading import Thread
+from flask import request
 from flask_restplus import Namespace, reqparse, Resource
+from werkzeug.datastructures import FileStorage
 
 from app.core.resource import token_checker
 from app.core.response import (
     CustomeResponse,
     return_500_for_sever_error,
     return_401_for_no_auth,
+    return_304_for_not_modified,
+    is_stream_requested,
 )
-from app.core.utils import execute_command_ssh
 from app.core.mongo_db import (
     mongo,
     gen_restrict_access_query,
     gen_query,
-    gen_random_docs_query,
-    gen_not_empty_array_query,
-    gen_match_and_query,
-    stringify_docs,
-    gen_collection_active_like_query,
-    gen_user_active_like_query,
     gen_return_fields_query,
     gen_include_query,
+    find_page,
+    find_stream_bound,
+    find_stream_page,
+    split_page,
+    gen_page_limit,
+    gen_page_headers,
+    decode_page_cursor,
+    decode_search_cursor,
+    split_search_page,
+    is_text_searchable,
+    find_text_search_page,
+    drop_text_scores,
+    find_offset_page,
+    TEXT_SEARCH,
+    REGEX_SEARCH,
 )
 from app.core.redis import redis_client
+from app.core.local_cache import LocalCache
+from app.core.serializer import encode, wrap_response_body
+from app.core.content_version import bump_content_version
+from app.core.catalog_terms import publish_term_change, PHRASAL_VERB
+from app.core.verb_particles import sync_verb_particle, rebuild_verb_particles
+from app.core.crawler_queue import enqueue_crawler_jobs
+from app.core.bulk_import import (
+    BulkImportError,
+    read_bulk_entries,
+    import_bulk_entries,
+    summarize_bulk_results,
+    refresh_after_bulk_import,
+)
+from app.core.fuzzy import fuzzy_index
+from app.core.like_counter import (
+    get_like_count,
+    get_likes,
+    get_user_like_active,
+    update_user_like,
+)
+from app.core.variables import MAX_BATCH_LIKE_COUNT
+from app.core.random_pool import (
+    get_random_docs,
+    sync_random_pool,
+    rebuild_random_pool,
+    remove_from_random_pool,
+)
 
 
 api = Namespace("phrasal-verbs", description="Phrasal_verbs related operations")
 
+PHRASAL_VERB_LIST_KEY = "phrasal_verb_list"
+PHRASAL_VERB_CATALOG_KEY = "phrasal_verb_catalog"
+PHRASAL_VERB_LIST_VERSION_KEY = "phrasal_verb_list_version"
+
+catalog_cache = LocalCache("catalog_cache")
+
 
 def get_random_public_verbs(count):
-    count = 1 if not count else count
     try:
-        match_and_filters = [
-            gen_not_empty_array_query("definitions"),
-            gen_not_empty_array_query("sentences"),
-            gen_restrict_access_query(),
-        ]
-        query = [
-            gen_match_and_query(match_and_filters),
-            gen_random_docs_query(count),
-        ]
-        return stringify_docs(mongo.db.phrasal_verbs.aggregate(query))
+        return get_random_docs(mongo.db.phrasal_verbs, count)
     except:
         traceback.print_exc()
         return None
@@ -55,47 +88,192 @@ def get_phrasal_verb(phrasal_verb):
         query = gen_restrict_access_query()
         query.update(gen_phrasal_verb_search_query(phrasal_verb))
         return_fields = gen_return_fields_query(excludes=["dictionaries", "is_public"])
-        return stringify_docs(mongo.db.phrasal_verbs.find(query, return_fields))
+        return list(mongo.db.phrasal_verbs.find(query, return_fields))
     except:
         traceback.print_exc()
         return None
 
-        
+
+# Applies hash patches only once the catalog was built by a full rebuild,
+# otherwise the first read would take a partial hash for the whole catalog.
+PATCH_CATALOG_SCRIPT = """
+if redis.call("EXISTS", KEYS[2]) == 0 then
+    return 0
+end
+local set_count = tonumber(ARGV[1])
+for i = 2, set_count * 2, 2 do
+    redis.call("HSET", KEYS[1], ARGV[i], ARGV[i + 1])
+end
+for i = set_count * 2 + 2, #ARGV do
+    redis.call("HDEL", KEYS[1], ARGV[i])
+end
+return redis.call("INCR", KEYS[2])
+"""
+
+
 def update_cached_phrasal_verb_list():
+    """Rebuild the whole cached catalog from mongodb"""
     phrasal_verb_list = get_verbs_from_phrasal_verbs()
-    redis_client.set('phrasal_verb_list', json.dumps(phrasal_verb_list))
+    if phrasal_verb_list is None:
+        return
+    temp_key = f"{PHRASAL_VERB_CATALOG_KEY}:rebuild"
+    pipeline = redis_client.pipeline()
+    pipeline.delete(temp_key)
+    for item in phrasal_verb_list:
+        pipeline.hset(temp_key, item["phrasal_verb"], encode(item))
+    if phrasal_verb_list:
+        pipeline.rename(temp_key, PHRASAL_VERB_CATALOG_KEY)
+    else:
+        pipeline.delete(PHRASAL_VERB_CATALOG_KEY)
+    pipeline.incr(PHRASAL_VERB_LIST_VERSION_KEY)
+    version = pipeline.execute()[-1]
+    catalog_cache.publish_invalidation(PHRASAL_VERB_LIST_KEY, version)
+
+
+def update_cached_phrasal_verb_entries(updated_items=None, deleted_phrasal_verbs=None):
+    """Patch only the given entries of the cached catalog"""
+    updated_items = updated_items or []
+    deleted_phrasal_verbs = deleted_phrasal_verbs or []
+    if not updated_items and not deleted_phrasal_verbs:
+        return
+    args = [len(updated_items)]
+    for item in updated_items:
+        args.extend([item["phrasal_verb"], encode(item)])
+    args.extend(deleted_phrasal_verbs)
+    try:
+        version = redis_client.eval(
+            PATCH_CATALOG_SCRIPT,
+            2,
+            PHRASAL_VERB_CATALOG_KEY,
+            PHRASAL_VERB_LIST_VERSION_KEY,
+            *args,
+        )
+        if version:
+            catalog_cache.publish_invalidation(PHRASAL_VERB_LIST_KEY, version)
+    except:
+        traceback.print_exc()
 
 
-def get_cached_phrasal_verb_list():
-    if phrasal_verb_list := redis_client.get("phrasal_verb_list"):
-        return json.loads(phrasal_verb_list)
+def sync_cached_phrasal_verb(search_query):
+    return_fields = gen_return_fields_query(
+        includes=["verb", "particle", "phrasal_verb", "is_public"]
+    )
+    doc = mongo.db.phrasal_verbs.find_one(search_query, return_fields)
+    if doc is None:
+        return
+    if doc.pop("is_public", None) == 1:
+        update_cached_phrasal_verb_entries(updated_items=[doc])
+        publish_term_change("add", PHRASAL_VERB, [doc["phrasal_verb"]])
     else:
-        phrasal_verb_list = get_verbs_from_phrasal_verbs()
-        redis_client.set('phrasal_verb_list', json.dumps(phrasal_verb_list))
-        return phrasal_verb_list
+        update_cached_phrasal_verb_entries(deleted_phrasal_verbs=[doc["phrasal_verb"]])
+        publish_term_change("remove", PHRASAL_VERB, [doc["phrasal_verb"]])
+
+
+def get_cached_phrasal_verb_entries():
+    pipeline = redis_client.pipeline()
+    pipeline.get(PHRASAL_VERB_LIST_VERSION_KEY)
+    pipeline.hgetall(PHRASAL_VERB_CATALOG_KEY)
+    return pipeline.execute()
+
+
+def get_cached_phrasal_verb_list_body():
+    """Encoded response body of the public phrasal verb list
+
+    Served from the worker's memory, redis is only read after an invalidation.
+    """
+    if body := catalog_cache.get(PHRASAL_VERB_LIST_KEY):
+        return body
+
+    version, entries = get_cached_phrasal_verb_entries()
+    if version is None:
+        update_cached_phrasal_verb_list()
+        version, entries = get_cached_phrasal_verb_entries()
+        if version is None:
+            return wrap_response_body(b"null", "SUCCESS")
+
+    phrasal_verb_list = b"[" + b", ".join(entries[key] for key in sorted(entries)) + b"]"
+    body = wrap_response_body(phrasal_verb_list, "SUCCESS")
+    catalog_cache.set(PHRASAL_VERB_LIST_KEY, int(version), body)
+    return body
+
 
-def get_verbs_from_phrasal_verbs(
+def gen_phrasal_verb_list_query(only_public):
+    """Return (query, return fields) of phrasal verb listings"""
+    if only_public:
+        return_fields = gen_return_fields_query(
+            includes=["verb", "particle", "phrasal_verb"]
+        )
+        return gen_restrict_access_query(), return_fields
+    return {}, None
+
+
+def gen_phrasal_verb_find_query(
     search_key=None, full_search=0, exact=0, only_public=True
 ):
+    query, return_fields = gen_phrasal_verb_list_query(only_public)
+    if search_key is not None:
+        if full_search:
+            query.update(gen_full_search_query(search_key, exact))
+        else:
+            query.update(gen_query("verb", search_key, exact))
+    return query, return_fields
+
+
+def find_verbs_from_phrasal_verbs(limit=None, after=None, **kwargs):
+    query, return_fields = gen_phrasal_verb_find_query(**kwargs)
+    return find_page(mongo.db.phrasal_verbs, query, return_fields, limit, after)
+
+
+def stream_verbs_from_phrasal_verbs(limit=None, after=None, **kwargs):
+    """Return (docs, next page cursor or None) of a stream of at most limit docs"""
+    query, return_fields = gen_phrasal_verb_find_query(**kwargs)
+    collection = mongo.db.phrasal_verbs
+    bound = None
+    if limit is not None:
+        bound = list(find_stream_bound(collection, query, limit, after))
+    return find_stream_page(collection, query, return_fields, limit, after, bound)
+
+
+def get_verbs_from_phrasal_verbs(**kwargs):
     try:
-        query = {}
-        return_fields = None
-        if only_public:
-            query = gen_restrict_access_query()
-            return_fields = gen_return_fields_query(
-                includes=["verb", "particle", "phrasal_verb"]
-            )
-        if search_key is not None:
-            if full_search:
-                query.update(gen_full_search_query(search_key, exact))
-            else:
-                query.update(gen_query("verb", search_key, exact))
-        return stringify_docs(mongo.db.phrasal_verbs.find(query, return_fields))
+        return list(find_verbs_from_phrasal_verbs(**kwargs))
     except:
         traceback.print_exc()
         return None
 
 
+def search_phrasal_verbs(search_key, only_public=True, limit=None, cursor=None):
+    """Ranked search, returns (docs, strategy served the query)
+
+    The text index serves the search unless the tokens are too short or it
+    matches nothing(partial words), then the regex full search is used.
+    """
+    try:
+        strategy, offset = cursor or (None, 0)
+        query, return_fields = gen_phrasal_verb_list_query(only_public)
+        if strategy != REGEX_SEARCH and is_text_searchable(search_key):
+            docs = drop_text_scores(
+                find_text_search_page(
+                    mongo.db.phrasal_verbs,
+                    query,
+                    search_key,
+                    return_fields,
+                    limit,
+                    offset,
+                )
+            )
+            if docs or strategy == TEXT_SEARCH:
+                return docs, TEXT_SEARCH
+        query.update(gen_full_search_query(search_key, exact=0))
+        docs = find_offset_page(
+            mongo.db.phrasal_verbs, query, return_fields, limit, offset
+        )
+        return list(docs), REGEX_SEARCH
+    except:
+        traceback.print_exc()
+        return None, None
+
+
 def gen_full_search_query(search_key, exact):
     return {
         "$or": [
@@ -138,6 +316,10 @@ def upsert_phrasal_verb(phrasal_verb_info):
         rs = mongo.db.phrasal_verbs.update(
             search_query, upsert_phrasal_verb, upsert=True
         )
+        sync_cached_phrasal_verb(search_query)
+        sync_random_pool(mongo.db.phrasal_verbs, search_query)
+        sync_verb_particle(verb, particle)
+        bump_content_version("phrasal_verbs")
         return phrasal_verb
 
     except:
@@ -145,11 +327,64 @@ def upsert_phrasal_verb(phrasal_verb_info):
         return False
 
 
+# (name, type, required) of the create parser's fields
+PHRASAL_VERB_FIELDS = [
+    ("verb", str, True),
+    ("particle", str, True),
+    ("definitions", list, False),
+    ("sentences", list, False),
+    ("difficulty", int, False),
+    ("is_public", int, False),
+]
+
+
+def import_phrasal_verbs(entries):
+    """Upsert the entries as POST does each, then refresh the caches once"""
+    results, written = import_bulk_entries(
+        mongo.db.phrasal_verbs,
+        entries,
+        PHRASAL_VERB_FIELDS,
+        gen_key=lambda entry: entry["phrasal_verb"],
+        gen_search_query=lambda entry: {
+            "verb": entry["verb"],
+            "particle": entry["particle"],
+        },
+        prepare_entry=lambda entry: {
+            **entry,
+            "phrasal_verb": f"{entry['verb']} {entry['particle']}",
+        },
+    )
+    if written:
+        public = [key for key, entry in written.items() if entry["is_public"] == 1]
+        private = [key for key, entry in written.items() if entry["is_public"] != 1]
+        refresh_after_bulk_import(
+            [
+                ("catalog", update_cached_phrasal_verb_list),
+                ("random_pool", lambda: rebuild_random_pool(mongo.db.phrasal_verbs)),
+                ("verb_particles", rebuild_verb_particles),
+                ("add_terms", lambda: publish_term_change("add", PHRASAL_VERB, public)),
+                (
+                    "remove_terms",
+                    lambda: publish_term_change("remove", PHRASAL_VERB, private),
+                ),
+                ("content_version", lambda: bump_content_version("phrasal_verbs")),
+                (
+                    "crawler_jobs",
+                    lambda: enqueue_crawler_jobs(
+                        [key.replace(" ", "-") for key in written]
+                    ),
+                ),
+            ]
+        )
+    return summarize_bulk_results(results)
+
+
 def upsert_phrasal_verb_dictionary(phrasal_verb, data):
     try:
         search_query = gen_phrasal_verb_search_query(phrasal_verb)
         upsert_dictionary = {"$set": {"dictionaries": data}}
         mongo.db.phrasal_verbs.update(search_query, upsert_dictionary, upsert=True)
+        bump_content_version("phrasal_verbs")
         return True
 
     except:
@@ -168,7 +403,24 @@ def delete_phrasal_verbs(args):
 
         if args["particle"] is not None:
             query["particle"] = args["verb"]
+        return_fields = gen_return_fields_query(
+            includes=["verb", "particle", "phrasal_verb"]
+        )
+        deleted_docs = list(mongo.db.phrasal_verbs.find(query, return_fields))
         mongo.db.phrasal_verbs.delete_many(query)
+        remove_from_random_pool(
+            mongo.db.phrasal_verbs, [doc["_id"] for doc in deleted_docs]
+        )
+        deleted_phrasal_verbs = [
+            doc["phrasal_verb"] for doc in deleted_docs if doc.get("phrasal_verb")
+        ]
+        update_cached_phrasal_verb_entries(deleted_phrasal_verbs=deleted_phrasal_verbs)
+        publish_term_change("remove", PHRASAL_VERB, deleted_phrasal_verbs)
+        for verb, particle in {
+            (doc.get("verb"), doc.get("particle")) for doc in deleted_docs
+        }:
+            sync_verb_particle(verb, particle)
+        bump_content_version("phrasal_verbs")
         return True
 
     except:
@@ -177,35 +429,21 @@ def delete_phrasal_verbs(args):
 
 
 def get_phrasal_verbs_like(phrasal_verb_id):
-    query = gen_collection_active_like_query(
-        field_key="phrasalVerbId", field_value=phrasal_verb_id
-    )
-    return mongo.db.user_like_phrasal_verb.find(query).count()
+    return get_like_count(mongo.db.user_like_phrasal_verb, phrasal_verb_id)
 
 
 def get_user_like_active_status(user_info, target):
     if user_info:
-        query = gen_user_active_like_query(
-            user_info.id,
-            field_key="phrasalVerbId",
-            field_value=target,
+        return get_user_like_active(
+            mongo.db.user_like_phrasal_verb, user_info.id, target
         )
-        if mongo.db.user_like_phrasal_verb.find_one(query):
-            return 1
     return 0
 
 
 def update_user_like_phrasal_verb(user_id, args):
     try:
-        search_query = {
-            "userId": user_id,
-            "phrasalVerbId": args.phrasal_verb_id,
-        }
-        user_like = search_query.copy()
-        user_like["active"] = args.like
-
-        mongo.db.user_like_phrasal_verb.replace_one(
-            search_query, user_like, upsert=True
+        update_user_like(
+            mongo.db.user_like_phrasal_verb, user_id, args.phrasal_verb_id, args.like
         )
         return True
     except:
@@ -213,21 +451,6 @@ def update_user_like_phrasal_verb(user_id, args):
         return None
 
 
-def start_crawler(keyword_):
-    try:
-        from app import config
-        cmd = f'{config.CRAWLER} {keyword_} phrasal_verbs server'
-        execute_command_ssh(cmd)
-    except:
-        traceback.print_exc()
-
-
-def start_crawler_job(keyword_):
-    thread = Thread(target=start_crawler, args=(keyword_,))
-    thread.daemon = True
-    thread.start()
-
-
 parser_create = reqparse.RequestParser()
 parser_create.add_argument("verb", type=str, required=True, help="Verb")
 parser_create.add_argument(
@@ -251,6 +474,16 @@ parser_search_verb.add_argument(
 parser_search_verb.add_argument(
     "exact", type=int, help="Search exact search key when 1", location="args"
 )
+parser_search_verb.add_argument(
+    "text_search",
+    type=int,
+    help="Ranked search in text indexes when 1",
+    location="args",
+)
+parser_search_verb.add_argument("limit", type=int, help="Page size", location="args")
+parser_search_verb.add_argument(
+    "after", type=str, help="X-Next-Cursor of the previous page", location="args"
+)
 
 parser_delete = reqparse.RequestParser()
 parser_delete.add_argument("_id", type=str, help="_id", location="args")
@@ -273,6 +506,19 @@ parser_like_create.add_argument(
 parser_like_create.add_argument("like", type=int, required=True, help="like when 1")
 
 
+parser_get_phrasal_verb_likes_batch = reqparse.RequestParser()
+parser_get_phrasal_verb_likes_batch.add_argument(
+    "phrasal_verb_ids",
+    type=str,
+    required=True,
+    action="split",
+    help="Comma separated _ids",
+    location="args",
+)
+parser_get_phrasal_verb_likes_batch.add_argument(
+    "Authorization", type=str, location="headers"
+)
+
 parser_dictionary = reqparse.RequestParser()
 parser_dictionary.add_argument("datetime", type=str, required=True)
 parser_dictionary.add_argument(
@@ -286,12 +532,21 @@ parser_dictionary.add_argument("examples", type=str, help="Examples", action="ap
 parser_random = reqparse.RequestParser()
 parser_random.add_argument("count", type=int, location="args")
 
+parser_bulk = reqparse.RequestParser()
+parser_bulk.add_argument(
+    "file",
+    type=FileStorage,
+    location="files",
+    help="JSON array or NDJSON of phrasal verbs, or send it as the body",
+)
+
 
 @api.route("/")
 class PhrasalVerbs(Resource, CustomeResponse):
     @api.doc("list of phrasal_verbs")
     @api.expect(parser_search_verb, parser_header)
     @token_checker
+    @return_304_for_not_modified("phrasal_verbs")
     @return_500_for_sever_error
     def get(self, **kwargs):
         """List all phrasal verbs"""
@@ -303,16 +558,57 @@ class PhrasalVerbs(Resource, CustomeResponse):
         full_search=args["full_search"]
         exact=args["exact"]
 
-        if only_public and not any([search_key, full_search, exact]):
-            result = get_cached_phrasal_verb_list()
-        else:
-            result = get_verbs_from_phrasal_verbs(
-                search_key=search_key,
-                full_search=full_search,
-                exact=exact,
-                only_public=only_public,
+        is_paginated = args["limit"] or args["after"]
+        is_stream = is_stream_requested()
+        if only_public and not any(
+            [search_key, full_search, exact, is_paginated, is_stream]
+        ):
+            return self.send_encoded(
+                get_cached_phrasal_verb_list_body(), response_type="SUCCESS"
             )
-        return self.send(response_type="SUCCESS", result=result)
+        if args["text_search"] and search_key:
+            return self.send_search_page(search_key, only_public, args)
+        if args["after"] and decode_page_cursor(args["after"]) is None:
+            return self.send(response_type="FAIL", additional_message="Invalid cursor")
+        search_args = {
+            "search_key": search_key,
+            "full_search": full_search,
+            "exact": exact,
+            "only_public": only_public,
+            "after": args["after"],
+        }
+        if is_stream:
+            if args["limit"] is not None and args["limit"] < 1:
+                return self.send(
+                    response_type="FAIL", additional_message="limit must be positive"
+                )
+            docs, next_cursor = stream_verbs_from_phrasal_verbs(
+                limit=args["limit"], **search_args
+            )
+            return self.send_stream(docs, headers=gen_page_headers(next_cursor))
+
+        limit = gen_page_limit(args["limit"])
+        result = get_verbs_from_phrasal_verbs(limit=limit, **search_args)
+        result, next_cursor = split_page(result, limit)
+        return self.send(
+            response_type="SUCCESS",
+            result=result,
+            headers=gen_page_headers(next_cursor),
+        )
+
+    def send_search_page(self, search_key, only_public, args):
+        cursor = None
+        if args["after"] and (cursor := decode_search_cursor(args["after"])) is None:
+            return self.send(response_type="FAIL", additional_message="Invalid cursor")
+        limit = gen_page_limit(args["limit"])
+        result, strategy = search_phrasal_verbs(search_key, only_public, limit, cursor)
+        offset = cursor[1] if cursor else 0
+        result, next_cursor = split_search_page(result, limit, offset, strategy)
+        return self.send(
+            response_type="SUCCESS",
+            result=result,
+            headers=gen_page_headers(next_cursor, search_strategy=strategy),
+        )
 
     @api.doc("add a phrasal verb")
     @api.expect(parser_create, parser_header)
@@ -325,8 +621,7 @@ class PhrasalVerbs(Resource, CustomeResponse):
         args = parser_create.parse_args()
         result = upsert_phrasal_verb(args)
         if result:
-            start_crawler_job(result.replace(" ", "-"))
-            update_cached_phrasal_verb_list()
+            enqueue_crawler_jobs([result.replace(" ", "-")])
             return self.send(response_type="CREATED")
         else:
             return self.send(response_type="FAIL")
@@ -341,11 +636,27 @@ class PhrasalVerbs(Resource, CustomeResponse):
             return self.send(response_type="FORBIDDEN")
         args = parser_delete.parse_args()
         result = delete_phrasal_verbs(args)
-        update_cached_phrasal_verb_list()
         response_type = "NO_CONTENT" if result else "FAIL"
         return self.send(response_type=response_type)
 
 
+@api.route("/bulk")
+class PhrasalVerbsBulk(Resource, CustomeResponse):
+    @api.doc("add or update many phrasal verbs")
+    @api.expect(parser_bulk, parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def post(self, **kwargs):
+        """Add or update phrasal verbs in one write, with the result of each entry"""
+        if not kwargs["auth_user"].is_admin():
+            return self.send(response_type="FORBIDDEN")
+        try:
+            entries = read_bulk_entries(request)
+        except BulkImportError as e:
+            return self.send(response_type="FAIL", additional_message=str(e))
+        return self.send(response_type="SUCCESS", result=import_phrasal_verbs(entries))
+
+
 @api.route("/random")
 class PhrasalVerbs(Resource, CustomeResponse):
     @api.expect(parser_random)
@@ -361,7 +672,7 @@ class PhrasalVerbs(Resource, CustomeResponse):
 def get_phrasal_verb_with_dictionary(phrasal_verb):
     try:
         search_query = gen_phrasal_verb_search_query(phrasal_verb)
-        return stringify_docs(mongo.db.phrasal_verbs.find(search_query))
+        return list(mongo.db.phrasal_verbs.find(search_query))
     except:
         traceback.print_exc()
         return None
@@ -381,6 +692,7 @@ class PhrasalVerb(Resource, CustomeResponse):
     @api.doc("phrasal_verb")
     @api.expect(parser_header)
     @token_checker
+    @return_304_for_not_modified("phrasal_verbs")
     @return_500_for_sever_error
     def get(self, phrasal_verb, **kwargs):
         """Get a phrasal verb"""
@@ -392,7 +704,10 @@ class PhrasalVerb(Resource, CustomeResponse):
         if result:
             return self.send(response_type="SUCCESS", result=result)
         else:
-            return self.send(response_type="NOT_FOUND")
+            did_you_mean = fuzzy_index.search(PHRASAL_VERB, phrasal_verb.replace("-", " "))
+            return self.send(
+                response_type="NOT_FOUND", result={"did_you_mean": did_you_mean}
+            )
 
     @api.expect(parser_header, parser_dictionary)
     @token_checker
@@ -439,3 +754,23 @@ class PhrasalVerbLikes(Resource, CustomeResponse):
             return self.send(response_type="SUCCESS")
         else:
             return self.send(response_type="FAIL")
+
+
+@api.route("/likes/batch")
+class PhrasalVerbLikesBatch(Resource, CustomeResponse):
+    @api.doc("phrasal verb likes of many items")
+    @api.expect(parser_get_phrasal_verb_likes_batch)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Like counts and the user's like states keyed by phrasal verb id"""
+        args = parser_get_phrasal_verb_likes_batch.parse_args()
+        item_ids = list(dict.fromkeys(id_ for id_ in args["phrasal_verb_ids"] if id_))
+        if not item_ids or len(item_ids) > MAX_BATCH_LIKE_COUNT:
+            return self.send(
+                response_type="FAIL",
+                additional_message=f"1 to {MAX_BATCH_LIKE_COUNT} ids",
+            )
+        user_id = kwargs["auth_user"].id
+        result = get_likes(mongo.db.user_like_phrasal_verb, user_id, item_ids)
+        return self.send(response_type="SUCCESS", result=result)
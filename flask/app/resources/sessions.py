@@ -1,14 +1,12 @@
 from flask_restplus import Namespace, reqparse, Resource
 
 from app.resources.users import get_user_if_verified
-from app.core.utils import random_string_digits
 from app.core.response import (
     CustomeResponse,
     return_401_for_no_auth,
     return_500_for_sever_error,
 )
-from app.core.variables import TOKEN_VALID_TIME
-from app.core.redis import redis_client
+from app.core.auth import create_session, delete_session, get_sessions
 
 api = Namespace("sessions", description="Sessions related operations")
 
@@ -20,11 +18,10 @@ parser_create.add_argument("password", type=str, required=True, help="Password")
 parser_header = reqparse.RequestParser()
 parser_header.add_argument("Authorization", type=str, required=True, location="headers")
 
-
-def create_session(user_id):
-    session_id = random_string_digits(30)
-    redis_client.set(name=session_id, value=user_id, ex=TOKEN_VALID_TIME)
-    return session_id
+parser_list = reqparse.RequestParser()
+parser_list.add_argument(
+    "user_id", type=int, help="Only the sessions of this user", location="args"
+)
 
 
 def set_user_info(user):
@@ -33,6 +30,22 @@ def set_user_info(user):
 
 @api.route("/")
 class Session(Resource, CustomeResponse):
+    @api.doc("list_sessions")
+    @api.expect(parser_header, parser_list)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """List live sessions with masked tokens
+
+        NOTE: Only for admin users
+        """
+        if kwargs["auth_user"].is_admin():
+            args = parser_list.parse_args()
+            return self.send(
+                response_type="SUCCESS", result=get_sessions(args["user_id"])
+            )
+        return self.send(response_type="FORBIDDEN")
+
     @api.doc("create_session")
     @api.expect(parser_create)
     @return_500_for_sever_error
@@ -44,7 +57,7 @@ class Session(Resource, CustomeResponse):
             result = {
                 "user": user.username,
                 "is_admin": 1 if user.is_admin() else 0,
-                "session": create_session(user.id),
+                "session": create_session(user),
             }
             return self.send(response_type="CREATED", result=result)
         return self.send(
@@ -55,9 +68,9 @@ class Session(Resource, CustomeResponse):
     @api.expect(parser_header)
     @return_401_for_no_auth
     @return_500_for_sever_error
-    def delete(self):
+    def delete(self, **kwargs):
         args = parser_header.parse_args()
-        redis_client.delete(args["Authorization"])
+        delete_session(args["Authorization"])
         return self.send(response_type="NO_CONTENT")
 
 
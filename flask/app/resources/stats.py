@@ -0,0 +1,114 @@
+from flask_restplus import Namespace, reqparse, Resource
+
+from app.core.auth import auth_cache
+from app.core.database import engine_registry
+from app.core.bootstrap import startup_report, get_bootstrap_report
+from app.core.crawler_queue import get_crawler_jobs_status
+from app.resources.users import get_orphaned_likes_job_status
+from app.core.response import (
+    return_401_for_no_auth,
+    return_500_for_sever_error,
+    CustomeResponse,
+)
+
+api = Namespace("stats", description="Runtime statistics of the serving worker")
+
+parser_header = reqparse.RequestParser()
+parser_header.add_argument("Authorization", type=str, required=True, location="headers")
+
+parser_crawler_jobs = reqparse.RequestParser()
+parser_crawler_jobs.add_argument(
+    "keyword", type=str, help="Job of the keyword only", location="args"
+)
+
+
+@api.route("/auth-cache")
+class AuthCacheStats(Resource, CustomeResponse):
+    @api.doc("get_auth_cache_stats")
+    @api.expect(parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Hit and miss counts of the worker's session cache
+
+        NOTE: Only for admin users
+        """
+        if kwargs["auth_user"].is_admin():
+            return self.send(response_type="SUCCESS", result=auth_cache.get_stats())
+        return self.send(response_type="FORBIDDEN")
+
+
+@api.route("/db-pool")
+class DbPoolStats(Resource, CustomeResponse):
+    @api.doc("get_db_pool_stats")
+    @api.expect(parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Connections checked out, overflow and checkout waits of the worker
+
+        NOTE: Only for admin users
+        """
+        if kwargs["auth_user"].is_admin():
+            return self.send(
+                response_type="SUCCESS", result=engine_registry.get_stats()
+            )
+        return self.send(response_type="FORBIDDEN")
+
+
+@api.route("/orphaned-likes")
+class OrphanedLikesStats(Resource, CustomeResponse):
+    @api.doc("get_orphaned_likes_stats")
+    @api.expect(parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Progress and counts of the last orphaned likes cleanup
+
+        NOTE: Only for admin users
+        """
+        if kwargs["auth_user"].is_admin():
+            return self.send(
+                response_type="SUCCESS", result=get_orphaned_likes_job_status()
+            )
+        return self.send(response_type="FORBIDDEN")
+
+
+@api.route("/startup")
+class StartupStats(Resource, CustomeResponse):
+    @api.doc("get_startup_stats")
+    @api.expect(parser_header)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Startup phase durations of the worker and of the bootstrap leader
+
+        NOTE: Only for admin users
+        """
+        if kwargs["auth_user"].is_admin():
+            result = {
+                "worker": startup_report.to_dict(),
+                "bootstrap": get_bootstrap_report(),
+            }
+            return self.send(response_type="SUCCESS", result=result)
+        return self.send(response_type="FORBIDDEN")
+
+
+@api.route("/crawler-jobs")
+class CrawlerJobsStats(Resource, CustomeResponse):
+    @api.doc("get_crawler_jobs_stats")
+    @api.expect(parser_header, parser_crawler_jobs)
+    @return_401_for_no_auth
+    @return_500_for_sever_error
+    def get(self, **kwargs):
+        """Queued, retrying and running crawler jobs with the recent job states
+
+        NOTE: Only for admin users
+        """
+        if not kwargs["auth_user"].is_admin():
+            return self.send(response_type="FORBIDDEN")
+        args = parser_crawler_jobs.parse_args()
+        result = get_crawler_jobs_status(args["keyword"])
+        if result is None:
+            return self.send(response_type="NOT_FOUND")
+        return self.send(response_type="SUCCESS", result=result)
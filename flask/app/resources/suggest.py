@@ -0,0 +1,33 @@
+from flask_restplus import Namespace, reqparse, Resource
+
+from app.core.suggest import suggest_index
+from app.core.response import (
+    return_500_for_sever_error,
+    CustomeResponse,
+)
+
+api = Namespace("suggest", description="Search box autocomplete")
+
+DEFAULT_SUGGEST_COUNT = 10
+MAX_SUGGEST_COUNT = 50
+
+parser_suggest = reqparse.RequestParser()
+parser_suggest.add_argument(
+    "q", type=str, required=True, help="Typed prefix", location="args"
+)
+parser_suggest.add_argument("limit", type=int, help="Max suggestions", location="args")
+
+
+@api.route("/")
+class Suggest(Resource, CustomeResponse):
+    @api.doc("suggest verbs, phrasal verbs and idioms")
+    @api.expect(parser_suggest)
+    @return_500_for_sever_error
+    def get(self):
+        """Complete a prefix with public verbs, phrasal verbs and idioms"""
+        args = parser_suggest.parse_args()
+        limit = min(args["limit"] or DEFAULT_SUGGEST_COUNT, MAX_SUGGEST_COUNT)
+        if not args["q"].strip():
+            return self.send(response_type="SUCCESS", result=[])
+        result = suggest_index.suggest(args["q"], limit)
+        return self.send(response_type="SUCCESS", result=result)
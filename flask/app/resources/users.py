@@ -1,5 +1,6 @@
+import time
 import traceback
-from bson import ObjectId
+from threading import Thread
 
 from flask_restplus import Namespace, reqparse, Resource
 from app.core.response import (
@@ -11,11 +12,30 @@ from app.core.response import (
 
 from app.core.models import User as UserModel, UserRole as UserRoleModel
 from app.core.database import db, get_db_session
-from app.core.mongo_db import mongo, gen_user_like_query, stringify_docs, gen_in_query
+from app.core.auth import invalidate_user_sessions, revoke_user_sessions
+from app.core.mongo_db import (
+    mongo,
+    gen_return_fields_query,
+    gen_page_limit,
+    gen_page_headers,
+    decode_page_cursor,
+)
+from app.core.redis import redis_client
+from app.core.redis_lock import acquire_lock
+from app.core.variables import ORPHANED_LIKES_CHECK_TIME, ORPHANED_LIKES_CHUNK_SIZE
+from app.core.like_counter import (
+    reconcile_like_counts,
+    delete_likes_and_counts,
+    get_user_like_count,
+    find_user_liked_items,
+)
 
 
 api = Namespace("users", description="Users related operations")
 
+ORPHANED_LIKES_JOB_KEY = "orphaned_likes_job"
+ORPHANED_LIKES_LOCK_KEY = "orphaned_likes_lock"
+
 
 def get_users() -> list:
     users = UserModel.query.all()
@@ -32,52 +52,38 @@ def get_user_if_verified(username, password):
 
 def get_user_idioms_count(user_id):
     try:
-        query = gen_user_like_query(user_id)
-        return mongo.db.user_like_idiom.find(query).count()
+        return get_user_like_count(mongo.db.user_like_idiom, user_id)
     except:
         traceback.print_exc()
         return None
 
 
-def get_user_idioms(user_id):
+def get_user_idioms(user_id, return_fields=None, limit=None, after=None):
     try:
-        likes_query = gen_user_like_query(user_id)
-        idioms_ids = []
-        for item in mongo.db.user_like_idiom.find(likes_query):
-            for key, value in item.items():
-                if key == "idiomId":
-                    idioms_ids.append(ObjectId(value))
-        idioms_query = gen_in_query(field="_id", values=idioms_ids)
-        return stringify_docs(mongo.db.idioms.find(idioms_query))
-
+        return find_user_liked_items(
+            mongo.db.user_like_idiom, user_id, return_fields, limit, after
+        )
     except:
         traceback.print_exc()
-        return None
+        return None, None
 
 
 def get_user_phrasal_verbs_count(user_id):
     try:
-        query = gen_user_like_query(user_id)
-        return mongo.db.user_like_phrasal_verb.find(query).count()
+        return get_user_like_count(mongo.db.user_like_phrasal_verb, user_id)
     except:
         traceback.print_exc()
         return None
 
 
-def get_user_phrasal_verbs(user_id):
+def get_user_phrasal_verbs(user_id, return_fields=None, limit=None, after=None):
     try:
-        likes_query = gen_user_like_query(user_id)
-        phrasal_verbs_ids = []
-        for item in mongo.db.user_like_phrasal_verb.find(likes_query):
-            for key, value in item.items():
-                if key == "phrasalVerbId":
-                    phrasal_verbs_ids.append(ObjectId(value))
-        phrasal_verbs_query = gen_in_query(field="_id", values=phrasal_verbs_ids)
-        return stringify_docs(mongo.db.phrasal_verbs.find(phrasal_verbs_query))
-
+        return find_user_liked_items(
+            mongo.db.user_like_phrasal_verb, user_id, return_fields, limit, after
+        )
     except:
         traceback.print_exc()
-        return None
+        return None, None
 
 
 def get_user_by_username(username) -> dict:
@@ -119,6 +125,7 @@ def create_user(args) -> dict:
 def delete_user(id_) -> None:
     UserModel.query.filter_by(id=id_).delete()
     db.session.commit()
+    revoke_user_sessions(id_)
 
 
 def update_user(user, arg) -> None:
@@ -127,30 +134,92 @@ def update_user(user, arg) -> None:
     if arg["email"] is not None:
         user.email = arg["email"]
     db.session.commit()
+    if arg["password"] is not None:
+        revoke_user_sessions(user.id)
+    else:
+        invalidate_user_sessions(user.id)
 
 
-def delete_not_existing_users_likes():
+def get_all_user_ids():
+    """Ids of every user with one query, usable outside of app contexts"""
     db_scoped_session = get_db_session()
-    db_session = db_scoped_session()
+    try:
+        return {user_id for (user_id,) in db_scoped_session.query(UserModel.id)}
+    finally:
+        db_scoped_session.remove()
 
-    idiom_like_users = mongo.db.user_like_idiom.distinct("userId", {})
-    for user_id in idiom_like_users:
-        try:
-            db_session.query(UserModel).filter_by(id=user_id).one()
-        except:
-            mongo.db.user_like_idiom.delete_many({"userId": user_id})
-    
-    phrasal_verb_like_users = mongo.db.user_like_phrasal_verb.distinct("userId", {}) 
-    for user_id in phrasal_verb_like_users:
+
+def report_orphaned_likes_job(**fields):
+    redis_client.hset(ORPHANED_LIKES_JOB_KEY, mapping=fields)
+
+
+def delete_orphaned_likes(like_collection):
+    """Delete the likes of users not in MySQL anymore, returns the deleted count
+
+    The user ids of the likes are read first, so users created meanwhile are
+    in the MySQL result too.
+    """
+    like_user_ids = set(like_collection.distinct("userId"))
+    orphaned_user_ids = list(like_user_ids - get_all_user_ids())
+    report_orphaned_likes_job(
+        collection=like_collection.name,
+        like_users=len(like_user_ids),
+        orphaned_users=len(orphaned_user_ids),
+    )
+    deleted_count = 0
+    for i in range(0, len(orphaned_user_ids), ORPHANED_LIKES_CHUNK_SIZE):
+        chunk = orphaned_user_ids[i : i + ORPHANED_LIKES_CHUNK_SIZE]
+        result = like_collection.delete_many({"userId": {"$in": chunk}})
+        deleted_count += result.deleted_count
+        report_orphaned_likes_job(
+            processed_users=i + len(chunk),
+            **{f"{like_collection.name}_deleted": deleted_count},
+        )
+    if deleted_count:
+        reconcile_like_counts(like_collection)
+    return deleted_count
+
+
+def delete_not_existing_users_likes():
+    # one worker per period does the work, the lock expires with the period
+    if not acquire_lock(ORPHANED_LIKES_LOCK_KEY, ORPHANED_LIKES_CHECK_TIME):
+        return
+    redis_client.delete(ORPHANED_LIKES_JOB_KEY)
+    report_orphaned_likes_job(state="running", started_at=int(time.time()))
+    try:
+        delete_orphaned_likes(mongo.db.user_like_idiom)
+        delete_orphaned_likes(mongo.db.user_like_phrasal_verb)
+        report_orphaned_likes_job(state="done", finished_at=int(time.time()))
+    except:
+        report_orphaned_likes_job(state="failed", finished_at=int(time.time()))
+        raise
+
+
+def get_orphaned_likes_job_status():
+    return {
+        key.decode("utf-8"): value.decode("utf-8")
+        for key, value in redis_client.hgetall(ORPHANED_LIKES_JOB_KEY).items()
+    }
+
+
+def delete_not_existing_users_likes_loop():
+    while True:
         try:
-            db_session.query(UserModel).filter_by(id=user_id).one()
+            delete_not_existing_users_likes()
         except:
-            mongo.db.user_like_phrasal_verb.delete_many({"userId": user_id})
+            traceback.print_exc()
+        time.sleep(ORPHANED_LIKES_CHECK_TIME)
+
+
+def delete_not_existing_users_likes_job():
+    thread = Thread(target=delete_not_existing_users_likes_loop)
+    thread.daemon = True
+    thread.start()
 
 
 def delete_user_likes(user_id):
-    mongo.db.user_like_idiom.delete_many({"userId": user_id})
-    mongo.db.user_like_phrasal_verb.delete_many({"userId": user_id})
+    delete_likes_and_counts(mongo.db.user_like_idiom, user_id)
+    delete_likes_and_counts(mongo.db.user_like_phrasal_verb, user_id)
 
 
 parser_create = reqparse.RequestParser()
@@ -177,6 +246,13 @@ parser_header.add_argument("Authorization", type=str, required=True, location="h
 
 parser_likes = reqparse.RequestParser()
 parser_likes.add_argument("count", type=int, location="args", help="When constant true")
+parser_likes.add_argument(
+    "fields", type=str, action="split", location="args", help="Fields to return"
+)
+parser_likes.add_argument("limit", type=int, help="Page size", location="args")
+parser_likes.add_argument(
+    "after", type=str, help="X-Next-Cursor of the previous page", location="args"
+)
 
 
 @api.route("/")
@@ -254,8 +330,24 @@ class User(Resource, CustomeResponse):
         return self.send(response_type="NOT_FOUND")
 
 
+class UserLikes(Resource, CustomeResponse):
+    def send_liked_items(self, get_liked_items, user_id, args):
+        if args["after"] and decode_page_cursor(args["after"]) is None:
+            return self.send(response_type="FAIL", additional_message="Invalid cursor")
+        limit = gen_page_limit(args["limit"])
+        return_fields = gen_return_fields_query(includes=args["fields"])
+        result, next_cursor = get_liked_items(
+            user_id, return_fields, limit, args["after"]
+        )
+        return self.send(
+            response_type="SUCCESS",
+            result=result,
+            headers=gen_page_headers(next_cursor),
+        )
+
+
 @api.route("/idioms")
-class UserLikesIdioms(Resource, CustomeResponse):
+class UserLikesIdioms(UserLikes):
     @api.doc("get_user_idioms_likes")
     @api.expect(parser_header, parser_likes)
     @return_401_for_no_auth
@@ -263,16 +355,15 @@ class UserLikesIdioms(Resource, CustomeResponse):
     def get(self, **kwargs):
         user_id = kwargs["auth_user"].id
         args = parser_likes.parse_args()
-        result = (
-            get_user_idioms_count(user_id)
-            if args["count"]
-            else get_user_idioms(user_id)
-        )
-        return self.send(response_type="SUCCESS", result=result)
+        if args["count"]:
+            return self.send(
+                response_type="SUCCESS", result=get_user_idioms_count(user_id)
+            )
+        return self.send_liked_items(get_user_idioms, user_id, args)
 
 
 @api.route("/phrasal-verbs")
-class UserLikesPhrasalVerbs(Resource, CustomeResponse):
+class UserLikesPhrasalVerbs(UserLikes):
     @api.doc("get_user_phrasal_verbs_likes")
     @api.expect(parser_header, parser_likes)
     @return_401_for_no_auth
@@ -280,9 +371,8 @@ class UserLikesPhrasalVerbs(Resource, CustomeResponse):
     def get(self, **kwargs):
         user_id = kwargs["auth_user"].id
         args = parser_likes.parse_args()
-        result = (
-            get_user_phrasal_verbs_count(user_id)
-            if args["count"]
-            else get_user_phrasal_verbs(user_id)
-        )
-        return self.send(response_type="SUCCESS", result=result)
+        if args["count"]:
+            return self.send(
+                response_type="SUCCESS", result=get_user_phrasal_verbs_count(user_id)
+            )
+        return self.send_liked_items(get_user_phrasal_verbs, user_id, args)
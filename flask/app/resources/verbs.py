@@ -1,9 +1,6 @@
 from flask_restplus import Namespace, reqparse, Resource
 
-from app.core.mongo_db import (
-    get_all_unique_field_values,
-    gen_restrict_access_query,
-)
+from app.core.verb_particles import verb_particle_index
 from app.core.response import (
     return_500_for_sever_error,
     return_401_for_no_auth,
@@ -23,8 +20,8 @@ class Verbs(Resource, CustomeResponse):
     @return_401_for_no_auth
     @return_500_for_sever_error
     def get(self, **kwargs):
-        query = {} if kwargs["auth_user"].is_admin() else gen_restrict_access_query()
-        verbs = get_all_unique_field_values("verb", query=query)
+        only_public = not kwargs["auth_user"].is_admin()
+        verbs = verb_particle_index.get_verbs(only_public)
         return self.send(response_type="SUCCESS", result=verbs)
 
 
@@ -34,8 +31,6 @@ class Verb(Resource, CustomeResponse):
     @return_401_for_no_auth
     @return_500_for_sever_error
     def get(self, verb, **kwargs):
-        query = {"verb": verb}
-        if not kwargs["auth_user"].is_admin():
-            query.update(gen_restrict_access_query())
-        particles = get_all_unique_field_values("particle", query=query)
+        only_public = not kwargs["auth_user"].is_admin()
+        particles = verb_particle_index.get_particles(verb, only_public)
         return self.send(response_type="SUCCESS", result=particles)
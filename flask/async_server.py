@@ -0,0 +1,12 @@
+import sys
+from aiohttp import web
+
+from config import config_by_name
+from app.async_api import create_async_app
+
+if __name__ == "__main__":
+    config_name = sys.argv[1]
+    config = config_by_name[config_name]
+    web.run_app(
+        create_async_app(config_name), host=config.HOST, port=int(config.ASYNC_PORT)
+    )
@@ -0,0 +1,174 @@
+"""Throughput and latency of the main read endpoints per gunicorn worker model
+
+Starts gunicorn once per mode(sync, gthread, gevent, or async for the
+aiohttp app of app.async_api) with the same worker count, runs the same
+concurrent load against each and prints requests per second with p50/p99
+latencies. Needs the .env of the app and reachable mysql, mongodb and redis.
+
+usage: python -m benchmarks.load_benchmark [modes] [concurrency] [requests]
+    modes: comma separated, default sync,gthread,gevent
+    BENCHMARK_OUTPUT: also write the results table to this file
+"""
+import os
+import sys
+import time
+import signal
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+
+PORT = int(os.getenv("BENCHMARK_PORT", 8765))
+ENDPOINTS = [
+    "/v1/phrasal-verbs/",
+    "/v1/phrasal-verbs/random",
+    "/v1/idioms/",
+    "/v1/idioms/random",
+    "/v1/verbs/",
+    "/v1/particles/",
+]
+ASYNC_ENDPOINTS = ENDPOINTS[:4]  # the async app only serves the catalog reads
+STARTUP_TIMEOUT = 60
+OUTPUT_PATH = os.getenv("BENCHMARK_OUTPUT")  # markdown table of the results
+
+
+def start_server(mode):
+    env = {
+        **os.environ,
+        "FLASK_PORT": str(PORT),
+        "FLASK_ASYNC_PORT": str(PORT),
+        "GUNICORN_WORKER_CLASS": mode,
+    }
+    env.pop("WORKER_CONCURRENCY", None)  # sized by gunicorn.conf.py per mode
+    conf = "./gunicorn.async.conf.py" if mode == "async" else "./gunicorn.conf.py"
+    command = [
+        "gunicorn",
+        "-c",
+        conf,
+        "--access-logfile",
+        "-",
+        "--error-logfile",
+        "-",
+        "--log-level",
+        "warning",
+    ]
+    if mode == "async":
+        command.append("app.async_api:create_async_app('prod')")
+        ready_path = ASYNC_ENDPOINTS[0]
+    else:
+        command.append("app:create_app('prod')")
+        ready_path = "/v1/particles/"
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+            request(connection, ready_path)
+            connection.close()
+            return process
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f"gunicorn({mode}) did not start in {STARTUP_TIMEOUT}s")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def request(connection, path):
+    connection.request("GET", path, headers={"Connection": "keep-alive"})
+    response = connection.getresponse()
+    response.read()
+    return response.status, response
+
+
+def run_client(path, count):
+    """One keep-alive client sending count requests, returns latencies"""
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+    latencies = []
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            status, _ = request(connection, path)
+            if status >= 500:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def percentile(sorted_values, ratio):
+    index = min(int(len(sorted_values) * ratio), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def benchmark_endpoint(path, concurrency, request_count):
+    per_client = max(request_count // concurrency, 1)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = [
+            executor.submit(run_client, path, per_client) for _ in range(concurrency)
+        ]
+        results = [future.result() for future in futures]
+    elapsed_time = time.perf_counter() - start
+    latencies = sorted(latency for result, _ in results for latency in result)
+    return {
+        "rps": len(latencies) / elapsed_time,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": sum(errors for _, errors in results),
+    }
+
+
+def gen_markdown_table(rows, concurrency, request_count):
+    lines = [
+        f"concurrency {concurrency}, {request_count} requests per endpoint",
+        "",
+        "| mode | endpoint | req/s | p50 ms | p99 ms | errors |",
+        "| --- | --- | ---: | ---: | ---: | ---: |",
+    ]
+    for mode, path, result in rows:
+        lines.append(
+            f"| {mode} | {path} | {result['rps']:.1f} | {result['p50_ms']:.2f}"
+            f" | {result['p99_ms']:.2f} | {result['errors']} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main(modes="sync,gthread,gevent", concurrency=50, request_count=2000):
+    rows = []
+    for mode in modes.split(","):
+        process = start_server(mode)
+        try:
+            for path in ASYNC_ENDPOINTS if mode == "async" else ENDPOINTS:
+                benchmark_endpoint(path, concurrency, concurrency)  # warm up
+                result = benchmark_endpoint(path, concurrency, request_count)
+                rows.append((mode, path, result))
+                print(
+                    f"{mode:8} {path:28} {result['rps']:8.1f} req/s"
+                    f"  p50 {result['p50_ms']:7.2f} ms"
+                    f"  p99 {result['p99_ms']:7.2f} ms"
+                    f"  errors {result['errors']}"
+                )
+        finally:
+            stop_server(process)
+    table = gen_markdown_table(rows, concurrency, request_count)
+    print(table)
+    if OUTPUT_PATH:
+        with open(OUTPUT_PATH, "w") as f:
+            f.write(table)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:4]
+    main(*args[:1], *[int(arg) for arg in args[1:]])
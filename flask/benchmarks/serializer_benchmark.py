@@ -0,0 +1,78 @@
+"""Per document cost of encoding a list response
+
+Compares the previous path(stringify_docs + json.JSONEncoder per call) with
+app.core.serializer on generated phrasal verb documents.
+
+usage: python -m benchmarks.serializer_benchmark [doc_count] [repeat]
+"""
+import sys
+import json
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.core.resource import json_serializer
+from app.core.serializer import encode_response_body
+
+
+def gen_docs(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "verb": f"verb{i}",
+            "particle": "up",
+            "phrasal_verb": f"verb{i} up",
+            "definitions": [f"definition {j} of verb{i} up" for j in range(3)],
+            "sentences": [f"sentence {j} with verb{i} up" for j in range(5)],
+            "difficulty": i % 5,
+            "is_public": 1,
+            "created_time": datetime.now(),
+            "dictionaries": {
+                "definitions": ["from dictionary"],
+                "examples": ["example"],
+                "sources": ["merriam", "cambridge"],
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_stringify_docs(docs):
+    items = []
+    for data in docs:
+        item = {}
+        for key, value in data.items():
+            if key == "_id":
+                value = str(value)
+            if key == "created_time":
+                value = json_serializer(value)
+            item[key] = value
+        items.append(item)
+    return items
+
+
+def legacy_encode(docs):
+    response_body = {"result": legacy_stringify_docs(docs), "message": "Success"}
+    return json.JSONEncoder().encode(response_body).encode("utf-8")
+
+
+def encode(docs):
+    return encode_response_body(docs, "SUCCESS")
+
+
+def main(doc_count=10000, repeat=20):
+    docs = gen_docs(doc_count)
+    assert json.loads(legacy_encode(docs)) == json.loads(encode(docs))
+
+    paths = [("stringify_docs + JSONEncoder", legacy_encode), ("serializer", encode)]
+    for name, func in paths:
+        best = min(timeit.repeat(lambda: func(docs), number=1, repeat=repeat))
+        print(
+            f"{name:30} total {best * 1000:8.2f} ms"
+            f"  per doc {best / doc_count * 1e6:6.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -6,6 +6,13 @@ APP_ROOT = os.path.join(os.path.dirname(__file__), "..")
 dotenv_path = os.path.join(APP_ROOT, ".env")
 load_dotenv(dotenv_path)
 
+# requests served at once by a worker, set by gunicorn.conf.py
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 1))
+# connections used by the background jobs of a worker
+BACKGROUND_CONNECTIONS = 2
+DEFAULT_DB_POOL_SIZE = min(WORKER_CONCURRENCY, 10) + BACKGROUND_CONNECTIONS
+DEFAULT_MONGO_MAX_POOL_SIZE = WORKER_CONCURRENCY + BACKGROUND_CONNECTIONS
+
 
 class Config:
     """https://flask.palletsprojects.com/en/2.0.x/config"""
@@ -20,6 +27,21 @@ class Config:
     SSH_USER = os.getenv("SSH_USER")
     SSH_PASSWORD = os.getenv("SSH_PASSWORD")
     CRAWLER = os.getenv("CRAWLER")
+    CRAWLER_EXECUTOR = os.getenv("CRAWLER_EXECUTOR", "ssh")  # ssh or local
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", DEFAULT_DB_POOL_SIZE)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 3600)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+    MONGO_MAX_POOL_SIZE = int(
+        os.getenv("MONGO_MAX_POOL_SIZE", DEFAULT_MONGO_MAX_POOL_SIZE)
+    )
+    # app.async_api serves every request of a process from one event loop
+    ASYNC_PORT = os.getenv("FLASK_ASYNC_PORT", 5001)
+    ASYNC_MONGO_MAX_POOL_SIZE = int(os.getenv("ASYNC_MONGO_MAX_POOL_SIZE", 100))
+    ASYNC_REDIS_MAX_CONNECTIONS = int(os.getenv("ASYNC_REDIS_MAX_CONNECTIONS", 50))
 
 
 class ProductionConfig(Config):
@@ -44,6 +66,7 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     DEBUG = True
     TESTING = True
+    CRAWLER_EXECUTOR = "local"
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI_TEST")
     MONGO_URI = os.getenv("MONGO_DB_URI_DEV")
     REDIS_URL = os.getenv("REDIS_URL_DEV")
@@ -0,0 +1,12 @@
+import os
+# https://docs.gunicorn.org/en/stable/settings.html
+# asyncio app of app.async_api, one event loop per worker and no gevent patching
+worker_class = "aiohttp.GunicornWebWorker"
+
+bind = f'0.0.0.0:{os.getenv("FLASK_ASYNC_PORT")}'
+workers = int(os.getenv("GUNICORN_ASYNC_WORKERS", os.getenv("GUNICORN_WORKERS", 2)))
+loglevel = 'debug'
+accesslog = './logs/access.log'
+acceslogformat ="%(h)s %(l)s %(u)s %(t)s %(r)s %(s)s %(b)s %(f)s %(a)s"
+errorlog =  './logs/error.log'
+capture_output = 'True' # for python print
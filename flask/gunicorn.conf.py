@@ -1,10 +1,24 @@
 import os
 # https://docs.gunicorn.org/en/stable/settings.html
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync") # sync, gthread or gevent
+# gevent workers monkey patch themselves before loading the app, keep preload_app off
+
 bind = f'0.0.0.0:{os.getenv("FLASK_PORT")}'
-worker_class = 'sync' # default = sync
-workers = 2 # default = 1
+workers = int(os.getenv("GUNICORN_WORKERS", 2)) # default = 1
+threads = int(os.getenv("GUNICORN_THREADS", 8 if worker_class == "gthread" else 1))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100)) # gevent only
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30)) # keep over BOOTSTRAP_WAIT_TIME
 loglevel = 'debug'
 accesslog = './logs/access.log'
 acceslogformat ="%(h)s %(l)s %(u)s %(t)s %(r)s %(s)s %(b)s %(f)s %(a)s"
 errorlog =  './logs/error.log'
 capture_output = 'True' # for python print
+
+# requests a worker serves at once, config.py sizes the connection pools by it
+if worker_class == "gevent":
+    worker_concurrency = worker_connections
+elif worker_class == "gthread":
+    worker_concurrency = threads
+else:
+    worker_concurrency = 1
+os.environ.setdefault("WORKER_CONCURRENCY", str(worker_concurrency))
@@ -0,0 +1,96 @@
+import pytest
+
+from app.core import crawler_queue
+from app.core.crawler_queue import SSHExecutor
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeChannel:
+    """Never exits, the command hangs until its deadline"""
+
+    def __init__(self):
+        self.closed = False
+
+    def recv_ready(self):
+        return False
+
+    def recv_stderr_ready(self):
+        return False
+
+    def exit_status_ready(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStdout:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.transport = FakeTransport()
+        self.channel = FakeChannel()
+        self.error = error
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, command, timeout=None):
+        if self.error:
+            raise self.error
+        return None, FakeStdout(self.channel), None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    monkeypatch.setattr(crawler_queue, "COMMAND_DEADLINE", -1)
+    monkeypatch.setattr(crawler_queue, "SSH_POLL_INTERVAL", 0)
+    return SSHExecutor(config=None)
+
+
+def test_timeout_closes_only_the_channel(executor):
+    client = executor.client = FakeClient()
+    with pytest.raises(TimeoutError):
+        executor.run("crawl")
+    assert client.channel.closed
+    assert not client.closed
+    assert executor.client is client
+
+
+def test_failed_transport_resets_the_client(executor):
+    client = executor.client = FakeClient(error=EOFError())
+    client.transport.active = False
+    executor.reset(client)
+    assert client.closed
+    assert executor.client is None
+
+
+def test_error_on_active_transport_keeps_the_client(executor):
+    client = executor.client = FakeClient(error=crawler_queue.paramiko.SSHException())
+    with pytest.raises(crawler_queue.paramiko.SSHException):
+        executor.run("crawl")
+    assert not client.closed
+    assert executor.client is client
+
+
+def test_reset_leaves_a_reconnected_client(executor):
+    failed = FakeClient()
+    failed.transport.active = False
+    client = executor.client = FakeClient()
+    executor.reset(failed)
+    assert not client.closed
+    assert executor.client is client
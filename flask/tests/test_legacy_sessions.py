@@ -0,0 +1,71 @@
+import pytest
+
+from app.core import auth
+
+LEGACY_TOKEN = "aB3" * 10
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def type(self, key):
+        if key in self.redis.values:
+            self.results.append(b"string")
+        else:
+            self.results.append(b"hash" if key in self.redis.hashes else b"none")
+
+    def get(self, key):
+        self.results.append(self.redis.values.get(key))
+
+    def ttl(self, key):
+        default = -1 if key in self.redis.values else -2
+        self.results.append(self.redis.ttls.get(key, default))
+
+    def execute(self, raise_on_error=True):
+        return self.results
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.ttls = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(auth, "redis_client", fake_redis)
+    return fake_redis
+
+
+def test_legacy_token_is_read(fake_redis):
+    fake_redis.values[LEGACY_TOKEN] = b"7"
+    fake_redis.ttls[LEGACY_TOKEN] = 60
+    assert auth.get_legacy_user_id(LEGACY_TOKEN) == 7
+
+
+@pytest.mark.parametrize(
+    "token, value, ttl",
+    [
+        ("liked_ids_ready:user_like_idiom:1", b"1", 60),  # a ready flag
+        (LEGACY_TOKEN, b"1", -1),  # no expiry, not a login
+        (LEGACY_TOKEN, b"abc", 60),  # not a user id
+        ("aB3" * 9, b"1", 60),  # too short
+    ],
+)
+def test_other_keys_are_not_sessions(fake_redis, token, value, ttl):
+    fake_redis.values[token] = value
+    fake_redis.ttls[token] = ttl
+    assert auth.get_legacy_user_id(token) is None
+
+
+def test_missing_and_hash_keys_are_not_sessions(fake_redis):
+    fake_redis.hashes[LEGACY_TOKEN] = {}
+    assert auth.get_legacy_user_id(LEGACY_TOKEN) is None
+    assert auth.get_legacy_user_id("cD4" * 10) is None
@@ -0,0 +1,64 @@
+import pytest
+from bson import ObjectId
+
+from app.core import like_counter
+from app.core.mongo_db import decode_page_cursor
+
+ITEM_IDS = [str(ObjectId()) for _ in range(3)]
+
+
+class FakeLikeCollection:
+    """Answers the aggregation with the rows it was given"""
+
+    name = "user_like_idiom"
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.query = None
+
+    def aggregate(self, query):
+        self.query = query
+        return iter([dict(row) for row in self.rows])
+
+
+@pytest.fixture
+def pending_likes(monkeypatch):
+    pending_likes = {}
+    monkeypatch.setattr(
+        like_counter, "get_pending_likes", lambda *args: pending_likes
+    )
+    return pending_likes
+
+
+def test_page_is_cut_before_the_lookup(pending_likes):
+    pending_likes.update({ITEM_IDS[1]: 1, ITEM_IDS[2]: 0})
+    collection = FakeLikeCollection([])
+    like_counter.find_user_liked_items(collection, 1, {"idiom": 1}, limit=2)
+    stages = [next(iter(stage)) for stage in collection.query]
+    assert stages == [
+        "$match",
+        "$project",
+        "$unionWith",
+        "$sort",
+        "$limit",
+        "$lookup",
+        "$unwind",
+        "$replaceRoot",
+    ]
+    assert collection.query[0]["$match"]["idiomId"]["$nin"] == ITEM_IDS[1:]
+    assert collection.query[4]["$limit"] == 3
+    union_match = collection.query[2]["$unionWith"]["pipeline"][0]["$match"]
+    assert union_match == {"_id": {"$in": [ObjectId(ITEM_IDS[1])]}}
+
+
+def test_cursor_follows_the_likes(pending_likes):
+    rows = [
+        {like_counter.LIKED_ID: ITEM_IDS[0], "_id": ITEM_IDS[0]},
+        {like_counter.LIKED_ID: ITEM_IDS[1]},  # the item was deleted
+        {like_counter.LIKED_ID: ITEM_IDS[2], "_id": ITEM_IDS[2]},
+    ]
+    collection = FakeLikeCollection(rows)
+    items, next_cursor = like_counter.find_user_liked_items(collection, 1, limit=2)
+    assert items == [{"_id": ITEM_IDS[0]}]
+    assert decode_page_cursor(next_cursor) == ObjectId(ITEM_IDS[1])
+    assert not any(stage.get("$unionWith") for stage in collection.query)
@@ -0,0 +1,98 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import redis_lock
+
+# app.resources binds the name users to the namespace, not the module
+users = importlib.import_module("app.resources.users")
+
+
+class FakeRedis:
+    """The redis calls of the orphaned likes job, kept in dicts"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value).encode("utf-8")
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.hashes.pop(key, None)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(
+            {
+                k.encode("utf-8"): str(v).encode("utf-8")
+                for k, v in mapping.items()
+            }
+        )
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+
+class FakeLikeCollection:
+    def __init__(self, name, likes):
+        self.name = name
+        self.likes = likes
+
+    def distinct(self, field):
+        return list({like[field] for like in self.likes})
+
+    def delete_many(self, query):
+        user_ids = set(query["userId"]["$in"])
+        kept = [like for like in self.likes if like["userId"] not in user_ids]
+        deleted_count = len(self.likes) - len(kept)
+        self.likes = kept
+        return SimpleNamespace(deleted_count=deleted_count)
+
+
+@pytest.fixture
+def job(monkeypatch):
+    fake_redis = FakeRedis()
+    db = SimpleNamespace(
+        user_like_idiom=FakeLikeCollection(
+            "user_like_idiom", [{"userId": 1}, {"userId": 2}]
+        ),
+        user_like_phrasal_verb=FakeLikeCollection(
+            "user_like_phrasal_verb", [{"userId": 3}]
+        ),
+    )
+    reconciled = []
+    monkeypatch.setattr(redis_lock, "redis_client", fake_redis)
+    monkeypatch.setattr(users, "redis_client", fake_redis)
+    monkeypatch.setattr(users, "mongo", SimpleNamespace(db=db))
+    monkeypatch.setattr(users, "get_all_user_ids", lambda: {1})
+    monkeypatch.setattr(
+        users, "reconcile_like_counts", lambda collection: reconciled.append(collection)
+    )
+    return SimpleNamespace(redis=fake_redis, db=db, reconciled=reconciled)
+
+
+def test_delete_not_existing_users_likes(job):
+    users.delete_not_existing_users_likes()
+
+    assert job.db.user_like_idiom.likes == [{"userId": 1}]
+    assert job.db.user_like_phrasal_verb.likes == []
+    assert job.reconciled == [job.db.user_like_idiom, job.db.user_like_phrasal_verb]
+    status = users.get_orphaned_likes_job_status()
+    assert status["state"] == "done"
+    assert status["user_like_idiom_deleted"] == "1"
+    assert status["user_like_phrasal_verb_deleted"] == "1"
+
+
+def test_delete_not_existing_users_likes_skips_while_locked(job):
+    job.redis.set(users.ORPHANED_LIKES_LOCK_KEY, "other", nx=True)
+
+    users.delete_not_existing_users_likes()
+
+    assert len(job.db.user_like_idiom.likes) == 2
+    assert users.get_orphaned_likes_job_status() == {}
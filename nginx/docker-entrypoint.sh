@@ -1,7 +1,7 @@
 #!/usr/bin/env bash
 set -eu
 
-envsubst '${FLASK} ${FLASK_PORT}' < /etc/nginx/conf.d/project.conf.template > /etc/nginx/conf.d/project.conf
+envsubst '${FLASK} ${FLASK_PORT} ${FLASK_ASYNC} ${FLASK_ASYNC_PORT}' < /etc/nginx/conf.d/project.conf.template > /etc/nginx/conf.d/project.conf
 
 exec "$@"
 